@@ -1,18 +1,22 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
 import plotly.express as px
-from datetime import date, time as dt_time, datetime
+from datetime import date, timedelta
 import io
 import time
 import re
-import os
 
 # --- ИМПОРТЫ ДЛЯ EXCEL ---
-from openpyxl.styles import PatternFill, Border, Side, Font, Alignment
-from openpyxl.utils import get_column_letter
+from excel_export import to_excel
 
-DB_FILE = 'construction_log.db'
+# --- DB LAYER (Connection-Pool, WAL) ---
+from db import init_db, ensure_schema, get_data, run_query, run_write, data_version, cache_stats, rebuild_rollups
+from queries import load_master, load_details, load_details_page, load_details_summary, load_project_totals, load_project_worker_hours, load_project_scaffold_hours, load_project_date_range, load_hours_timeseries, load_portfolio, search_entries, catalog_projects, catalog_workers, catalog_scaffolds, DETAIL_EXPORT_COLUMNS, DETAIL_PAGE_SIZES, TIME_BUCKETS, TIME_SPLITS, SEARCH_PAGE_SIZE, SEARCH_RANK_LIMIT, SEARCH_COUNT_LIMIT, PORTFOLIO_METRICS
+from instrumentation import start_rerun, finish_rerun, timer, summarize, path_totals, slow_queries, export_json, set_slow_threshold, reset as reset_profile, PROFILE_CONFIG
+from snapshot import refresh_snapshot, load_master_snapshot, load_project_totals_snapshot, load_project_worker_hours_snapshot, load_project_scaffold_hours_snapshot, to_parquet
+from import_jobs import get_runner, load_jobs, load_job_logs, preview_import, JOB_STATUS_LABELS
+from excel_import import PREVIEW_STATUS, preview_counts
+from timesheet import week_start, week_days, load_week, changed_cells, validate_week, save_week, MAX_HOURS_PER_DAY
 
 # --- CSS ---
 def local_css():
@@ -42,37 +46,11 @@ def local_css():
     </style>
     """, unsafe_allow_html=True)
 
+# --- PROFILING (pro Rerun, siehe instrumentation.py) ---
+start_rerun()
+
 # --- DB INIT ---
-def init_db(force_reset=False):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    
-    if force_reset:
-        c.execute("DROP TABLE IF EXISTS work_logs")
-        c.execute("DROP TABLE IF EXISTS scaffolds")
-        c.execute("DROP TABLE IF EXISTS projects")
-        c.execute("DROP TABLE IF EXISTS workers")
-        
-    c.execute('''CREATE TABLE IF NOT EXISTS projects (id INTEGER PRIMARY KEY, name TEXT UNIQUE)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS workers (id INTEGER PRIMARY KEY, name TEXT UNIQUE, position TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS scaffolds (
-        id INTEGER PRIMARY KEY, 
-        project_id INTEGER NOT NULL, 
-        number TEXT, 
-        description TEXT, 
-        volume_m3 REAL, 
-        area_m2 REAL, 
-        weight_to REAL, 
-        material_cost REAL, 
-        acc TEXT, 
-        FOREIGN KEY(project_id) REFERENCES projects(id), 
-        UNIQUE(project_id, number))''')
-    c.execute('''CREATE TABLE IF NOT EXISTS work_logs (id INTEGER PRIMARY KEY, user_name TEXT, project_name TEXT, scaffold_number TEXT, work_date DATE, hours REAL, comment TEXT, version TEXT)''')
-    conn.commit()
-    conn.close()
-
-if not os.path.exists(DB_FILE):
-    init_db()
+ensure_schema()
 
 # --- STATE ---
 if 'logged_in' not in st.session_state: st.session_state['logged_in'] = False
@@ -80,49 +58,11 @@ if 'user_role' not in st.session_state: st.session_state['user_role'] = None
 if 'current_user_name' not in st.session_state: st.session_state['current_user_name'] = None
 if 'admin_warning_shown' not in st.session_state: st.session_state['admin_warning_shown'] = False
 
-def get_data(query, params=()):
-    conn = sqlite3.connect(DB_FILE)
-    df = pd.read_sql_query(query, conn, params=params)
-    conn.close()
-    return df
-
-def run_query(query, params=()):
-    try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute(query, params)
-        conn.commit()
-        conn.close()
-        return True
-    except Exception as e:
-        return str(e)
+# --- NAVIGATION ---
+WORKER_SECTIONS = ["🕒 Arbeitszeit erfassen", "🏗️ Daten nach Planung"]
+ADMIN_SECTIONS = ["📋 Gerüstübersicht", "📈 KPI & Analytik", "👥 Mitarbeiter", "🏗️ Projekte/Gerüste", "📥 Daten-Import"]
 
 # --- HELPER FUNCTIONS ---
-def safe_float(val):
-    if pd.isna(val) or val == '': return 0.0
-    if isinstance(val, (int, float)): return float(val)
-    if isinstance(val, str):
-        try: return float(val.replace(',', '.').replace(' ', '').strip())
-        except: return 0.0
-    return 0.0
-
-def parse_hours(val):
-    if pd.isna(val) or val == '': return 0.0
-    if isinstance(val, dt_time): return val.hour + val.minute / 60.0
-    if isinstance(val, datetime): return val.hour + val.minute / 60.0
-    return safe_float(val)
-
-def clean_scaffold_number(val):
-    if pd.isna(val): return ""
-    s = str(val).strip()
-    if s.endswith(".0"): return s[:-2]
-    return s
-
-def get_col_val(row, possibilities):
-    for col in possibilities:
-        if col in row: return row[col]
-    return None
-
 def get_export_filename(selected_projects):
     if selected_projects and len(selected_projects) == 1:
         proj_name = selected_projects[0]
@@ -134,35 +74,211 @@ def get_export_filename(selected_projects):
     else:
         return "Gesamt_Engineering Stunden.xlsx"
 
-def to_excel(df, sheet_name='Report'):
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name=sheet_name)
-        workbook = writer.book
-        worksheet = writer.sheets[sheet_name]
-        header_fill = PatternFill(start_color="E0E0E0", end_color="E0E0E0", fill_type="solid")
-        header_font = Font(bold=True)
-        thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
-        for cell in worksheet[1]:
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.border = thin_border
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-        for row in worksheet.iter_rows(min_row=2):
-            for cell in row:
-                cell.border = thin_border
-                if isinstance(cell.value, (int, float)): cell.alignment = Alignment(horizontal='right')
-                else: cell.alignment = Alignment(horizontal='left')
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-            for cell in column:
+# Exporte erst beim Klick erzeugen (callable für st.download_button) und die Bytes
+# pro Filterauswahl + DB-Datenversion cachen -> normale Reruns kosten nichts
+@st.cache_data(max_entries=16, show_spinner=False)
+def build_master_export(projects, workers, scaffolds, db_version):
+    return to_excel(load_master(projects, workers, scaffolds), "Gerüste")
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def build_details_export(projects, workers, scaffolds, date_from, date_to, db_version):
+    return to_excel(load_details(projects, workers, scaffolds, date_from, date_to)[DETAIL_EXPORT_COLUMNS], "Stundenübersicht")
+
+# Import-Aufträge: läuft ein Job, pollt das Fragment jede Sekunde (nur dieser Teil
+# der Seite wird neu ausgeführt); danach ein voller Rerun mit den neuen Daten
+def import_jobs_panel(polling):
+    jobs = load_jobs()
+    if jobs.empty: return
+    active_ids = set(jobs.loc[jobs['status'].isin(['queued', 'running']), 'id'])
+
+    # Eigener Job fertig -> Logs in die Session übernehmen
+    job_id = st.session_state.get('import_job')
+    if job_id and job_id not in active_ids:
+        res = load_job_logs(job_id)
+        if res:
+            logs = res['logs'].split("\n") if res['logs'] else []
+            if res['status'] == 'failed': logs.append(f"❌ Kritischer Fehler: {res['error']}")
+            st.session_state['import_logs'] = logs
+        del st.session_state['import_job']
+        st.rerun()
+    if polling and not active_ids: st.rerun()
+
+    st.markdown("#### 📋 Import-Aufträge")
+    for _, job in jobs[jobs['status'] == 'running'].iterrows():
+        st.info(f"🔄 {job['filename']}: {job['stage']} – {int(job['live_rows'] or 0)} Zeilen verarbeitet")
+    done_rows = (jobs['rows_scaffolds'].fillna(0).astype(int).astype(str) + " Gerüste / " + jobs['rows_hours'].fillna(0).astype(int).astype(str) + " Stunden / "
+                 + jobs['rows_skipped'].fillna(0).astype(int).astype(str) + " unverändert")
+    st.dataframe(pd.DataFrame({
+        'Datei': jobs['filename'],
+        'Status': jobs['status'].map(JOB_STATUS_LABELS),
+        'Phase': jobs['stage'].fillna(''),
+        'Ergebnis': done_rows.where(jobs['status'] == 'done', jobs['error'].fillna('')),
+        'Erstellt': jobs['created_at'],
+    }), hide_index=True, use_container_width=True)
+
+    finished = jobs[~jobs['id'].isin(active_ids)]
+    if not finished.empty:
+        c1, c2 = st.columns([3, 1])
+        labels = dict(zip(finished['id'], finished['created_at'] + " – " + finished['filename']))
+        sel_job = c1.selectbox("Logs eines Auftrags anzeigen:", list(labels), format_func=labels.get, key="sel_import_job")
+        if c2.button("Logs laden", key="btn_load_job_logs"):
+            st.session_state['import_job'] = sel_job; st.rerun()
+
+# Import-Vorschau (Dry-Run): Diff je Blatt, erst "Übernehmen" schreibt (als Import-Auftrag,
+# ohne die Datei erneut zu lesen). Angezeigt werden höchstens PREVIEW_MAX_ROWS Zeilen.
+PREVIEW_MAX_ROWS = 1000
+PREVIEW_COLUMNS = {
+    'Gerüste': {'row': 'Zeile', 'status': 'Status', 'note': 'Hinweis', 'number': 'Gerüstnummer', 'description': 'Beschreibung',
+                'volume_m3': 'm3', 'area_m2': 'm2', 'weight_to': 'to', 'material_cost': 'Materialwert', 'acc': 'ACC'},
+    'Stundenübersicht': {'row': 'Zeile', 'status': 'Status', 'note': 'Hinweis', 'work_date': 'Datum', 'user_name': 'Name',
+                         'scaffold_number': 'Gerüstnummer', 'hours': 'Stunden', 'comment': 'Anmerkungen', 'version': 'Versionsnummer'},
+}
+
+def import_preview_panel(preview):
+    st.markdown(f"#### 🔍 Vorschau: {preview['filename']}")
+    target = preview['project_name'] if preview['project_id'] else f"{preview['prefix']} (wird neu angelegt)"
+    st.caption(f"Projekt: {target} | erstellt {preview['created_at']} | noch nichts gespeichert")
+    if not preview['sheets']: st.warning("Keine Blätter 'Gerüste' / 'Stundenübersicht' gefunden.")
+    for sheet, frame in preview['sheets'].items():
+        st.markdown(f"**{sheet}** ({len(frame)} Zeilen)")
+        counts = preview_counts(frame)
+        for col, status in zip(st.columns(len(PREVIEW_STATUS)), PREVIEW_STATUS): col.metric(status, int(counts[status]))
+        shown = st.multiselect("Status anzeigen", PREVIEW_STATUS, [s for s in PREVIEW_STATUS if s != 'unverändert'], key=f"pv_status_{sheet}")
+        rows = frame[frame['status'].isin(shown)]
+        if len(rows) > PREVIEW_MAX_ROWS: st.caption(f"Erste {PREVIEW_MAX_ROWS} von {len(rows)} Zeilen.")
+        columns = PREVIEW_COLUMNS[sheet]
+        st.dataframe(rows.head(PREVIEW_MAX_ROWS)[list(columns)].rename(columns=columns), hide_index=True, use_container_width=True)
+    if preview.get('new_workers'):
+        st.info(f"👤 {len(preview['new_workers'])} neue Mitarbeiter werden angelegt: {', '.join(preview['new_workers'][:20])}"
+                + (" …" if len(preview['new_workers']) > 20 else ""))
+
+    c1, c2 = st.columns(2)
+    if c1.button("✅ Vorschau übernehmen", key="btn_apply_preview", type="primary"):
+        st.session_state['import_job'] = get_runner().submit_preview(preview)
+        del st.session_state['import_preview']; st.rerun()
+    if c2.button("Verwerfen", key="btn_discard_preview"):
+        del st.session_state['import_preview']; st.rerun()
+
+# Wochenraster: Zellen werden im Formular bearbeitet (kein Rerun pro Eingabe), beim
+# Speichern gehen nur die geänderten Zellen in einer Transaktion in die DB
+def timesheet_grid(worker_name, project_id):
+    c1, c2 = st.columns([1, 2])
+    start = week_start(c1.date_input("Woche", date.today(), key="w_week", format="DD.MM.YYYY"))
+    days = list(week_days(start))
+    c2.markdown(f"<br>Woche vom {start:%d.%m.} bis {start + timedelta(days=6):%d.%m.%Y}", unsafe_allow_html=True)
+    grid, cells = load_week(worker_name, project_id, start)
+    if grid.empty: st.info("Keine Gerüste für dieses Projekt."); return
+    locked = sum(1 for v in cells.values() if v[1] > 1)
+    if locked: st.caption(f"🔒 {locked} Zelle(n) mit mehreren Buchungen – nur über die Einzelbuchung änderbar.")
+
+    rev = st.session_state.get('week_grid_rev', 0)
+    with st.form("wf_week"):
+        edited = st.data_editor(grid, key=f"week_grid_{project_id}_{start}_{rev}", hide_index=True, use_container_width=True,
+                                disabled=['Gerüst'], num_rows="fixed",
+                                column_config={d: st.column_config.NumberColumn(d, min_value=0.0, max_value=MAX_HOURS_PER_DAY, step=0.5, format="%.1f") for d in days})
+        c3, c4 = st.columns(2)
+        comment = c3.text_input("Anmerkungen für neue Buchungen (Optional)")
+        version = c4.text_input("Versionsnummer für neue Buchungen (Optional)")
+        if st.form_submit_button("Woche speichern"):
+            changes = changed_cells(grid, edited, start)
+            errors = validate_week(edited, changes, cells, start)
+            if not changes: st.info("Keine Änderungen.")
+            elif errors:
+                for err in errors: st.error(err)
+            else:
                 try:
-                    if len(str(cell.value)) > max_length: max_length = len(str(cell.value))
-                except: pass
-            adjusted_width = (max_length + 2) * 1.1
-            worksheet.column_dimensions[column_letter].width = adjusted_width
-    return output.getvalue()
+                    res = save_week(worker_name, project_id, start, changes, comment, version)
+                    st.session_state['week_grid_rev'] = rev + 1
+                    st.session_state['week_grid_msg'] = f"Gespeichert: {res['inserted']} neu, {res['updated']} geändert, {res['deleted']} gelöscht."
+                    st.rerun()
+                except ValueError as e: st.error(str(e))
+    msg = st.session_state.pop('week_grid_msg', None)
+    if msg: st.success(msg)
+
+# Portfolio: alle Projekte aus einer Abfrage (queries.load_portfolio); Ranking und
+# Top-N/"Sonstige" macht SQLite, die Gesamtkennzahlen kommen aus derselben Tabelle
+PORTFOLIO_FORMATS = {
+    "m3": st.column_config.NumberColumn("m³", format="%.0f"),
+    "to": st.column_config.NumberColumn("to", format="%.1f"),
+    "Materialwert": st.column_config.NumberColumn("Materialwert", format="%.0f €"),
+    "Planungsstunden": st.column_config.NumberColumn("Planungsstunden", format="%.1f h"),
+    "Euro/m3": st.column_config.NumberColumn("Euro/m³", format="%.2f €"),
+    "kg/m3": st.column_config.NumberColumn("kg/m³", format="%.1f kg"),
+    "h/m3": st.column_config.NumberColumn("Stunden/m³", format="%.3f h"),
+}
+
+def portfolio_panel():
+    c1, c2, c3 = st.columns([2, 1, 2])
+    metric = c1.selectbox("Ranking nach", list(PORTFOLIO_METRICS), key="pf_metric")
+    ascending = c2.radio("Reihenfolge", ["absteigend", "aufsteigend"], key="pf_order") == "aufsteigend"
+    top_n = c3.slider("Top-N (Rest = Sonstige)", 5, 50, 15, key="pf_top")
+    df = load_portfolio(metric, top_n, ascending)
+    if df.empty: st.warning("Keine Projekte."); return
+
+    vol, weight, cost, hours = df['m3'].sum(), df['to'].sum(), df['Materialwert'].sum(), df['Planungsstunden'].sum()
+    k1, k2, k3, k4, k5 = st.columns(5)
+    k1.metric("Projekte", f"{int(df['Projekte'].sum())}")
+    k2.metric("Gesamtvolumen", f"{vol:,.0f} m³")
+    k3.metric("Materialwert", f"{cost:,.0f} €")
+    k4.metric("Ø Euro/m³ | kg/m³", f"{cost / vol if vol else 0:.2f} € | {weight * 1000 / vol if vol else 0:.0f}")
+    k5.metric("Planungsstunden", f"{hours:,.0f} h", f"{hours / vol if vol else 0:.3f} h/m³", delta_color="off")
+
+    column = PORTFOLIO_METRICS[metric].strip('"')
+    with timer('plotly', "Portfolio Ranking"):
+        fig = px.bar(df, x='Projekt', y=column, title=f"Ranking: {metric}", color=column, color_continuous_scale='Blues')
+        fig.update_xaxes(categoryorder='array', categoryarray=df['Projekt'].tolist())
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(df, hide_index=True, use_container_width=True, column_config=PORTFOLIO_FORMATS)
+
+# Performance-Profil: letzter vollständiger Rerun dieser Session + prozessweite Summen
+def render_profile_panel():
+    st.markdown("### ⏱️ Performance-Profil")
+    profile = st.session_state.get('rerun_profile')
+    if profile:
+        summary = summarize(profile)
+        sql = summary.get('sql', {'count': 0, 'rows': 0, 'cached': 0, 'seconds': 0.0})
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Letzter Rerun", f"{profile['duration_s'] * 1000:.0f} ms")
+        m2.metric("SQL-Abfragen", f"{sql['count']} ({sql['cached']} Cache)")
+        m3.metric("Zeilen gelesen", f"{sql['rows']:,}")
+        m4.metric("SQL-Zeit", f"{sql['seconds'] * 1000:.0f} ms")
+        st.dataframe(pd.DataFrame([dict(Bereich=k, Anzahl=v['count'], Zeit_ms=round(v['seconds'] * 1000, 1), Zeilen=v['rows'], Cache=v['cached'])
+                                   for k, v in summary.items()]), hide_index=True, use_container_width=True)
+        events = pd.DataFrame(profile['events'])
+        if not events.empty:
+            events['ms'] = (events.pop('seconds') * 1000).round(1)
+            with st.expander("Einzelmessungen (letzter Rerun)"):
+                st.dataframe(events.sort_values('ms', ascending=False), hide_index=True, use_container_width=True)
+
+    hot = pd.DataFrame(path_totals())
+    if not hot.empty:
+        st.caption("Prozessweit (seit Start / Zurücksetzen), sortiert nach Gesamtzeit:")
+        hot['total_ms'] = (hot.pop('total_s') * 1000).round(1)
+        hot['max_ms'] = (hot.pop('max_s') * 1000).round(1)
+        st.dataframe(hot.sort_values('total_ms', ascending=False).head(30), hide_index=True, use_container_width=True)
+
+    threshold = st.number_input("Slow-Query-Schwelle (ms)", min_value=1, value=int(PROFILE_CONFIG['slow_query_ms']), step=50, key="slow_query_ms")
+    if threshold != PROFILE_CONFIG['slow_query_ms']: set_slow_threshold(threshold)
+    slow = slow_queries()
+    st.caption(f"🐢 Slow-Query-Log: {len(slow)} Einträge")
+    for entry in reversed(slow[-10:]):
+        with st.expander(f"{entry['ms']} ms | {entry['rows']} Zeilen | {entry['sql'][:80]}"):
+            st.code(entry['sql'], language='sql')
+            if entry['params']: st.caption(f"Parameter: {entry['params']}")
+            st.text(entry['plan'] or "")
+
+    c1, c2 = st.columns(2)
+    c1.download_button("📥 Profil als JSON", data=lambda: export_json(profile), file_name="promaintain_profil.json", mime="application/json")
+    if c2.button("Messwerte zurücksetzen", key="btn_reset_profile"): reset_profile(); st.rerun()
+
+# Parquet für die Finanzabteilung (ungestylt, typisiert, deutlich schneller als xlsx)
+@st.cache_data(max_entries=16, show_spinner=False)
+def build_master_parquet(projects, workers, scaffolds, db_version):
+    return to_parquet(load_master(projects, workers, scaffolds))
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def build_details_parquet(projects, workers, scaffolds, date_from, date_to, db_version):
+    return to_parquet(load_details(projects, workers, scaffolds, date_from, date_to)[DETAIL_EXPORT_COLUMNS])
 
 def get_template_excel():
     output = io.BytesIO()
@@ -228,14 +344,17 @@ else:
     # --- WORKER ---
     if st.session_state['user_role'] == 'worker':
         st.title(f"Willkommen, {st.session_state['current_user_name']}")
-        tab_work, tab_design = st.tabs(["🕒 Arbeitszeit erfassen", "🏗️ Daten nach Planung"])
+        # Nur der gewählte Bereich wird ausgeführt (siehe ADMIN unten)
+        section = st.radio("Bereich", WORKER_SECTIONS, horizontal=True, key="worker_section", label_visibility="collapsed")
+        projects_df = get_data("SELECT id, name FROM projects")
 
-        with tab_work:
+        def section_work():
             st.subheader("📝 Stunden buchen (Stundenübersicht)")
-            projects_df = get_data("SELECT id, name FROM projects")
             if not projects_df.empty:
                 p_map = dict(zip(projects_df['name'], projects_df['id']))
                 sel_proj = st.selectbox("Projekt wählen", projects_df['name'], key="w_proj")
+                mode = st.radio("Erfassung", ["Einzelbuchung", "Wochenraster"], horizontal=True, key="w_mode")
+                if mode == "Wochenraster": timesheet_grid(st.session_state['current_user_name'], p_map[sel_proj]); return
                 scaf_df = get_data("SELECT number, description FROM scaffolds WHERE project_id = ?", (p_map[sel_proj],))
                 
                 if not scaf_df.empty:
@@ -249,15 +368,15 @@ else:
                         comment = c3.text_input("Anmerkungen (Optional)")
                         version = c4.text_input("Versionsnummer (Optional)")
                         if st.form_submit_button("Zeit buchen"):
-                            run_query("INSERT INTO work_logs (user_name, project_name, scaffold_number, work_date, hours, comment, version) VALUES (?, ?, ?, ?, ?, ?, ?)", 
-                                      (st.session_state['current_user_name'], sel_proj, s_scaf.split(" (")[0], w_date, hours, comment, version))
-                            st.success("Gespeichert!"); time.sleep(1); st.rerun()
+                            res = run_query("INSERT INTO work_logs (user_name, project_name, scaffold_number, work_date, hours, comment, version) VALUES (?, ?, ?, ?, ?, ?, ?)", 
+                                            (st.session_state['current_user_name'], sel_proj, s_scaf.split(" (")[0], w_date.isoformat(), hours, comment, version))
+                            if res == True: st.success("Gespeichert!"); time.sleep(1); st.rerun()
+                            else: st.error(f"Nicht gespeichert: {res}")
                 else: st.info("Keine Gerüste für dieses Projekt.")
             else: st.warning("Keine Projekte.")
 
-        with tab_design:
+        def section_design():
             st.subheader("🏗️ Daten nach abgeschlossener Planung erfassen")
-            projects_df = get_data("SELECT id, name FROM projects")
             if not projects_df.empty:
                 p_map = dict(zip(projects_df['name'], projects_df['id']))
                 design_proj = st.selectbox("Ziel-Projekt", projects_df['name'], key="d_proj")
@@ -286,70 +405,36 @@ else:
                                 success = run_query("UPDATE scaffolds SET description=?, acc=?, volume_m3=?, area_m2=?, weight_to=?, material_cost=? WHERE project_id=? AND number=?", 
                                                     (new_desc, new_acc, new_vol, new_area, new_weight, new_cost, p_map[design_proj], sel_num))
                                 if success == True: st.success("Gespeichert!"); time.sleep(1.5); st.rerun()
+                                else: st.error(f"Nicht gespeichert: {success}")
                             else: st.error("Fehler: 'to' und 'Materialwert' müssen > 0 sein.")
                 else: st.warning("Keine Gerüste.")
             else: st.warning("Keine Projekte.")
 
+        st.fragment(dict(zip(WORKER_SECTIONS, [section_work, section_design]))[section])()
+
     # --- ADMIN ---
     elif st.session_state['user_role'] == 'admin':
         st.title("⚙️ Administrationsbereich")
-        tab0, tab1, tab2, tab3, tab4 = st.tabs(["📋 Gerüstübersicht", "📈 KPI & Analytik", "👥 Mitarbeiter", "🏗️ Projekte/Gerüste", "📥 Daten-Import"])
-
-        # TAB 0: MASTER TABLE
-        with tab0:
+        # Master-Tabelle und KPI wahlweise aus dem Arrow-Snapshot (snapshot.py) statt per SQL
+        use_snapshot = st.toggle("⚡ Analyse-Snapshot (Arrow) für Gerüstübersicht & KPI", key="use_snapshot")
+        if use_snapshot:
+            snap = refresh_snapshot()
+            st.caption(f"Snapshot: {snap['rows']} Buchungen bis ID {snap['last_id']}, {len(snap['parts'])} Teil-Datei(en) ({snap['mode']})")
+        section = st.radio("Bereich", ADMIN_SECTIONS, horizontal=True, key="admin_section", label_visibility="collapsed")
+
+        # BEREICH 0: MASTER TABLE
+        def section_master():
             st.subheader("📋 Gerüstübersicht (Master-Tabelle)")
-            query_raw = "SELECT * FROM work_logs" 
-            raw_logs = get_data(query_raw)
-            all_projects = get_data("SELECT name FROM projects")['name'].tolist()
             col_f1, col_f2, col_f3 = st.columns(3)
-            search_project = col_f1.multiselect("Projekt:", all_projects)
-            all_workers = sorted(list(set(raw_logs['user_name'].unique()))) if not raw_logs.empty else []
-            search_worker = col_f2.multiselect("Verantwortlich (Planer):", all_workers)
-            
-            if search_project:
-                scaffolds_in_proj = get_data(f"SELECT s.number FROM scaffolds s JOIN projects p ON s.project_id = p.id WHERE p.name IN ({','.join(['?']*len(search_project))})", tuple(search_project))
-                available_scaffolds = sorted(scaffolds_in_proj['number'].tolist())
-            else:
-                available_scaffolds = get_data("SELECT number FROM scaffolds")['number'].tolist()
+            search_project = col_f1.multiselect("Projekt:", catalog_projects())
+            search_worker = col_f2.multiselect("Verantwortlich (Planer):", catalog_workers(search_project))
+            available_scaffolds = catalog_scaffolds(search_project)
             search_scaffold = col_f3.multiselect("Gerüst (Nr.):", available_scaffolds)
 
-            query_master = '''
-                SELECT 
-                    p.name as Projekt,
-                    s.number as Gerüstnummer,
-                    s.description as Beschreibung,
-                    s.acc as ACC,
-                    s.volume_m3 as m3,
-                    s.area_m2 as m2,
-                    s.weight_to as "to",
-                    s.material_cost as Materialwert,
-                    w.user_name as Planer,
-                    w.hours as Planungsstunden
-                FROM scaffolds s
-                JOIN projects p ON s.project_id = p.id
-                LEFT JOIN work_logs w ON s.number = w.scaffold_number AND p.name = w.project_name
-            '''
-            master_raw = get_data(query_master)
-            
-            if not master_raw.empty:
-                if search_project: master_raw = master_raw[master_raw['Projekt'].isin(search_project)]
-                if search_worker: master_raw = master_raw[master_raw['Planer'].isin(search_worker)]
-                if search_scaffold: master_raw = master_raw[master_raw['Gerüstnummer'].isin(search_scaffold)]
-
-                agg_df = master_raw.groupby(['Projekt', 'Gerüstnummer', 'Beschreibung', 'ACC', 'm3', 'm2', 'to', 'Materialwert']).agg({
-                    'Planungsstunden': 'sum',
-                    'Planer': lambda x: ", ".join(sorted(list(set([str(i) for i in x if i is not None]))))
-                }).reset_index()
-                
-                agg_df = agg_df.fillna(0)
-                agg_df['Eur/to'] = agg_df.apply(lambda x: x['Materialwert'] / x['to'] if x['to'] > 0 else 0, axis=1)
-                agg_df['Euro/m3'] = agg_df.apply(lambda x: x['Materialwert'] / x['m3'] if x['m3'] > 0 else 0, axis=1)
-                agg_df['kg/m3'] = agg_df.apply(lambda x: (x['to'] * 1000) / x['m3'] if x['m3'] > 0 else 0, axis=1)
-
-                final_columns_order = ['Gerüstnummer', 'm3', 'm2', 'to', 'Materialwert', 'Eur/to', 'Euro/m3', 'kg/m3', 'Planer', 'ACC', 'Beschreibung', 'Planungsstunden']
-                display_cols = ['Projekt'] + [c for c in final_columns_order if c in agg_df.columns]
-                final_df = agg_df[display_cols]
+            # Filter + Aggregation + Kennzahlen in einer SQL-Abfrage (queries.py)
+            final_df = (load_master_snapshot if use_snapshot else load_master)(search_project, search_worker, search_scaffold)
 
+            if not final_df.empty:
                 st.dataframe(final_df, use_container_width=True, 
                              column_config={
                                  "m3": st.column_config.NumberColumn("m³", format="%.0f"),
@@ -362,38 +447,73 @@ else:
                                  "Planungsstunden": st.column_config.NumberColumn("Planungsstunden", format="%.1f h"),
                              })
                 
-                if not final_df.empty:
-                    filename = get_export_filename(search_project)
-                    st.download_button(label="📥 Master-Tabelle exportieren", data=to_excel(final_df, "Gerüste"), file_name=filename, mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+                filename = get_export_filename(search_project)
+                export_key = (tuple(search_project), tuple(search_worker), tuple(search_scaffold), data_version())
+                c_x1, c_x2 = st.columns(2)
+                c_x1.download_button(label="📥 Master-Tabelle exportieren", data=lambda: build_master_export(*export_key), file_name=filename, mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+                c_x2.download_button(label="📥 Als Parquet (Finanzen)", data=lambda: build_master_parquet(*export_key), file_name=filename.replace(".xlsx", ".parquet"), mime="application/octet-stream", key="dl_master_parquet")
+
+            st.divider()
+            st.subheader("🔎 Volltextsuche (Anmerkungen, Version, Beschreibung)")
+            search_text = st.text_input("Suchbegriff", key="fts_text", placeholder="z.B. Statik v2")
+            if search_text:
+                if st.session_state.get('fts_last') != search_text:
+                    st.session_state['fts_last'] = search_text; st.session_state['fts_page'] = 0
+                fts_page = st.session_state['fts_page']
+                hits, total_hits = search_entries(search_text, fts_page)
+                if total_hits == 0: st.info("Keine Treffer.")
+                else:
+                    # Zeile anklicken -> ID in "Eintrag bearbeiten / löschen" übernehmen
+                    event = st.dataframe(hits, hide_index=True, use_container_width=True, on_select="rerun", selection_mode="single-row", key=f"fts_hits_{fts_page}")
+                    fts_pages = -(-min(total_hits, SEARCH_RANK_LIMIT) // SEARCH_PAGE_SIZE)
+                    c_prev, c_info, c_next = st.columns([1, 3, 1])
+                    # Seitenwechsel per on_click: der Klick führt nur das Fragment neu aus, kein zweiter Rerun
+                    c_prev.button("◀ Zurück", disabled=fts_page == 0, key="fts_prev", on_click=lambda: st.session_state.update(fts_page=fts_page - 1))
+                    ranked_note = f" (gerankt: die neuesten {SEARCH_RANK_LIMIT})" if total_hits > SEARCH_RANK_LIMIT else ""
+                    hits_label = f"{SEARCH_COUNT_LIMIT}+" if total_hits > SEARCH_COUNT_LIMIT else str(total_hits)
+                    c_info.caption(f"Seite {fts_page + 1} von {fts_pages} | {hits_label} Treffer{ranked_note} | Zeile anklicken zum Bearbeiten")
+                    c_next.button("Weiter ▶", disabled=fts_page + 1 >= fts_pages, key="fts_next", on_click=lambda: st.session_state.update(fts_page=fts_page + 1))
+                    if event.selection.rows:
+                        picked = int(hits['id'].iloc[event.selection.rows[0]])
+                        if st.session_state.get('fts_pick') != picked:
+                            st.session_state['fts_pick'] = picked; st.session_state['edit_log_id'] = picked
 
             st.divider()
             st.subheader("🛠 Stundenübersicht & Korrektur")
-            query_details = "SELECT id, work_date as Datum, user_name as Name, scaffold_number as Gerüstnummer, hours as Stunden, comment as Anmerkungen, version as Versionsnummer, project_name as Projekt FROM work_logs WHERE 1=1"
-            params_d = []
-            if search_project:
-                query_details += f" AND project_name IN ({','.join(['?']*len(search_project))})"
-                params_d.extend(search_project)
-            if search_worker:
-                query_details += f" AND user_name IN ({','.join(['?']*len(search_worker))})"
-                params_d.extend(search_worker)
-            if search_scaffold:
-                query_details += f" AND scaffold_number IN ({','.join(['?']*len(search_scaffold))})"
-                params_d.extend(search_scaffold)
-            query_details += " ORDER BY id DESC"
-            df_details = get_data(query_details, tuple(params_d))
+            col_d1, col_d2 = st.columns([2, 1])
+            date_range = col_d1.date_input("Zeitraum (Datum):", value=(), key="details_range")
+            date_from = date_range[0] if len(date_range) > 0 else None
+            date_to = date_range[1] if len(date_range) > 1 else date_from
+            page_size = col_d2.selectbox("Zeilen pro Seite", DETAIL_PAGE_SIZES, index=1, key="details_page_size")
+            details_filter = (tuple(search_project), tuple(search_worker), tuple(search_scaffold), date_from, date_to)
+
+            # Keyset-Pagination: Stapel der "id <"-Cursor; bei neuem Filter zurück auf Seite 1
+            if st.session_state.get('details_filter') != (details_filter, page_size):
+                st.session_state['details_filter'] = (details_filter, page_size)
+                st.session_state['details_cursors'] = []
+            cursors = st.session_state['details_cursors']
+
+            summary = load_details_summary(*details_filter)
+            df_details, has_more = load_details_page(*details_filter, before_id=cursors[-1] if cursors else None, page_size=page_size)
             st.dataframe(df_details, use_container_width=True, column_config={"id": None})
+
+            total_pages = max(1, -(-int(summary['entries']) // page_size))
+            c_prev, c_info, c_next = st.columns([1, 3, 1])
+            c_prev.button("◀ Zurück", disabled=not cursors, key="details_prev", on_click=cursors.pop)
+            c_info.caption(f"Seite {len(cursors) + 1} von {total_pages} | {int(summary['entries'])} Einträge | Summe: {summary['hours']:.1f} h")
+            c_next.button("Weiter ▶", disabled=not has_more, key="details_next", on_click=cursors.append, args=(int(df_details['id'].iloc[-1]),) if has_more else ())
             
-            if not df_details.empty:
-                export_cols = ['Datum', 'Name', 'Gerüstnummer', 'Stunden', 'Anmerkungen', 'Versionsnummer']
-                valid_export_cols = [c for c in export_cols if c in df_details.columns]
-                df_export_stunden = df_details[valid_export_cols]
+            if summary['entries'] > 0:
                 filename_stunden = get_export_filename(search_project).replace("Engineering Stunden", "Stundenuebersicht")
-                st.download_button(label="📥 Stundenübersicht exportieren", data=to_excel(df_export_stunden, "Stundenübersicht"), file_name=filename_stunden, mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+                details_key = details_filter + (data_version(),)
+                c_x1, c_x2 = st.columns(2)
+                c_x1.download_button(label="📥 Stundenübersicht exportieren", data=lambda: build_details_export(*details_key), file_name=filename_stunden, mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+                c_x2.download_button(label="📥 Als Parquet (Finanzen)", data=lambda: build_details_parquet(*details_key), file_name=filename_stunden.replace(".xlsx", ".parquet"), mime="application/octet-stream", key="dl_details_parquet")
             
-            with st.expander("Eintrag bearbeiten / löschen (Nach ID)", expanded=False):
-                st.caption("Referenz-Tabelle (ID):")
+            with st.expander("Eintrag bearbeiten / löschen (Nach ID)", expanded=bool(st.session_state.get('edit_log_id'))):
+                st.caption("Referenz-Tabelle (ID, aktuelle Seite):")
                 st.dataframe(df_details[['id', 'Datum', 'Name', 'Gerüstnummer', 'Stunden']], hide_index=True)
-                edit_id_log = st.number_input("ID eingeben:", min_value=0, step=1)
+                edit_id_log = st.number_input("ID eingeben:", min_value=0, step=1, key="edit_log_id")
                 if edit_id_log > 0:
                     log_match = get_data("SELECT * FROM work_logs WHERE id=?", (edit_id_log,))
                     if not log_match.empty:
@@ -405,23 +525,28 @@ else:
                             c3, c4 = st.columns(2)
                             new_h = c3.number_input("Stunden", value=float(l_row['hours']), step=0.5)
                             if st.form_submit_button("✅ Speichern"):
-                                run_query("UPDATE work_logs SET hours=?, comment=?, version=? WHERE id=?", (new_h, new_comm, new_ver, edit_id_log))
-                                st.success("Korrigiert!"); time.sleep(1); st.rerun()
+                                res = run_query("UPDATE work_logs SET hours=?, comment=?, version=? WHERE id=?", (new_h, new_comm, new_ver, edit_id_log))
+                                if res == True: st.success("Korrigiert!"); time.sleep(1); st.rerun()
+                                else: st.error(f"Nicht gespeichert: {res}")
                         if st.button("🗑️ Löschen"):
-                            run_query("DELETE FROM work_logs WHERE id=?", (edit_id_log,))
-                            st.rerun()
+                            res = run_query("DELETE FROM work_logs WHERE id=?", (edit_id_log,))
+                            if res == True: st.rerun()
+                            else: st.error(f"Nicht gelöscht: {res}")
 
-        # TAB 1: KPI
-        with tab1:
+        # BEREICH 1: KPI
+        def section_kpi():
             st.subheader("Projekt-Controlling")
+            kpi_view = st.radio("Ansicht", ["Einzelprojekt", "Portfolio (alle Projekte)"], horizontal=True, key="kpi_view")
+            if kpi_view != "Einzelprojekt": portfolio_panel(); return
+            all_projects = catalog_projects()
             if not all_projects: st.warning("Keine Projekte.")
             else:
                 col_kpi_1, col_kpi_2 = st.columns([1, 2])
                 selected_project = col_kpi_1.selectbox("Projekt wählen", all_projects)
-                scaffolds_data = get_data('SELECT s.volume_m3, s.material_cost FROM scaffolds s JOIN projects p ON s.project_id = p.id WHERE p.name = ?', (selected_project,))
-                scaffolds_data = scaffolds_data.fillna(0)
-                total_vol = scaffolds_data['volume_m3'].sum()
-                total_cost = scaffolds_data['material_cost'].sum()
+                # Kennzahlen aus den Rollup-Tabellen (Trigger-gepflegt)
+                totals = (load_project_totals_snapshot if use_snapshot else load_project_totals)(selected_project)
+                total_vol = totals['volume_m3'].sum()
+                total_cost = totals['material_cost'].sum()
                 avg_price = total_cost / total_vol if total_vol > 0 else 0
                 st.markdown(f"**Projektkennzahlen: {selected_project}**")
                 k1, k2, k3 = st.columns(3)
@@ -430,54 +555,84 @@ else:
                 k3.metric("Ø Preis / m³", f"{avg_price:.2f} €")
                 st.markdown("---")
                 
-                # DATA FETCH FOR CHARTS
-                log_data = get_data("SELECT user_name, scaffold_number, hours FROM work_logs WHERE project_name = ?", (selected_project,))
+                # DATA FETCH FOR CHARTS (bereits je Mitarbeiter / Gerüst summiert)
+                bar_data = (load_project_worker_hours_snapshot if use_snapshot else load_project_worker_hours)(selected_project)
                 
-                if not log_data.empty:
+                if not bar_data.empty:
                     c_chart1, c_chart2 = st.columns(2)
                     
                     with c_chart1:
                         # Bar Chart: User Hours
-                        bar_data = log_data.groupby('user_name')['hours'].sum().reset_index()
-                        fig_bar = px.bar(bar_data, x='user_name', y='hours', title="Stunden pro Mitarbeiter", color='hours', color_continuous_scale='Blues')
+                        with timer('plotly', "KPI Balken Mitarbeiter"):
+                            fig_bar = px.bar(bar_data, x='user_name', y='hours', title="Stunden pro Mitarbeiter", color='hours', color_continuous_scale='Blues')
                         st.plotly_chart(fig_bar, use_container_width=True)
                         
                     with c_chart2:
                         # Pie Chart: Scaffold Hours (Group small slices)
-                        pie_data = log_data.groupby('scaffold_number')['hours'].sum().reset_index()
+                        pie_data = (load_project_scaffold_hours_snapshot if use_snapshot else load_project_scaffold_hours)(selected_project)
                         
                         # --- LOGIC FOR "SONSTIGE" ---
-                        total_h = pie_data['hours'].sum()
+                        with timer('pandas', "KPI Sonstige-Gruppierung"):
+                            total_h = pie_data['hours'].sum()
+                            if total_h > 0:
+                                threshold = 0.03 * total_h # 3%
+
+                                main_data = pie_data[pie_data['hours'] >= threshold]
+                                small_data = pie_data[pie_data['hours'] < threshold]
+
+                                if not small_data.empty:
+                                    other_sum = small_data['hours'].sum()
+                                    other_row = pd.DataFrame({'scaffold_number': ['Sonstige'], 'hours': [other_sum]})
+                                    pie_data_final = pd.concat([main_data, other_row], ignore_index=True)
+                                else:
+                                    pie_data_final = main_data
+
                         if total_h > 0:
-                            threshold = 0.03 * total_h # 3%
-                            
-                            main_data = pie_data[pie_data['hours'] >= threshold]
-                            small_data = pie_data[pie_data['hours'] < threshold]
-                            
-                            if not small_data.empty:
-                                other_sum = small_data['hours'].sum()
-                                other_row = pd.DataFrame({'scaffold_number': ['Sonstige'], 'hours': [other_sum]})
-                                pie_data_final = pd.concat([main_data, other_row], ignore_index=True)
-                            else:
-                                pie_data_final = main_data
-                                
-                            fig_pie = px.pie(pie_data_final, values='hours', names='scaffold_number', 
-                                             title="Stundenverteilung (Top Gerüste)", hole=0.4)
+                            with timer('plotly', "KPI Torte Gerüste"):
+                                fig_pie = px.pie(pie_data_final, values='hours', names='scaffold_number', 
+                                                 title="Stundenverteilung (Top Gerüste)", hole=0.4)
                             st.plotly_chart(fig_pie, use_container_width=True)
                 else:
                     st.info("Keine Arbeitsstunden für dieses Projekt gebucht.")
 
-        # TAB 2: Workers
-        with tab2:
+                # --- ZEITVERLAUF (aus rollup_daily) ---
+                st.markdown("---")
+                st.markdown("**📅 Stunden im Zeitverlauf**")
+                span = load_project_date_range(selected_project)
+                if span['last']:
+                    last_day = date.fromisoformat(span['last'])
+                    default_from = max(date.fromisoformat(span['first']), date(last_day.year, 3 * ((last_day.month - 1) // 3) + 1, 1))
+                    c_t1, c_t2, c_t3 = st.columns([2, 1, 1])
+                    ts_range = c_t1.date_input("Zeitraum", value=(default_from, last_day), key=f"ts_range_{selected_project}")
+                    ts_bucket = c_t2.radio("Raster", list(TIME_BUCKETS), index=1, horizontal=True, key="ts_bucket")
+                    ts_split = c_t3.selectbox("Aufteilen nach", list(TIME_SPLITS), index=1, key="ts_split")
+                    if len(ts_range) == 2:
+                        ts = load_hours_timeseries(selected_project, ts_range[0], ts_range[1], ts_bucket, ts_split)
+                        if ts.empty: st.info("Keine Buchungen im gewählten Zeitraum.")
+                        else:
+                            with timer('plotly', "KPI Zeitverlauf"):
+                                fig_ts = px.bar(ts, x='Zeitraum', y='Stunden', color='Gruppe', title=f"Stunden pro {ts_bucket} ({ts_split})")
+                            st.plotly_chart(fig_ts, use_container_width=True)
+                            with timer('pandas', "KPI Zeitverlauf Pivot"):
+                                pivot = ts.pivot_table(index='Zeitraum', columns='Gruppe', values='Stunden', aggfunc='sum', fill_value=0.0)
+                            st.dataframe(pivot, use_container_width=True)
+                else:
+                    st.info("Keine datierten Buchungen für dieses Projekt.")
+
+        # BEREICH 2: Workers
+        def section_workers():
             st.subheader("Personal")
             with st.form("aw"):
                 n, p = st.text_input("Name"), st.text_input("Position")
                 if st.form_submit_button("Hinzufügen"):
-                    if n: run_query("INSERT INTO workers (name, position) VALUES (?, ?)", (n, p)); st.rerun()
+                    if n:
+                        res = run_query("INSERT INTO workers (name, position) VALUES (?, ?)", (n, p))
+                        if res is True: st.rerun()
+                        else: st.error(f"Nicht gespeichert: {res}")
             st.dataframe(get_data("SELECT * FROM workers"), hide_index=True, use_container_width=True)
 
-        # TAB 3: Projects & Scaffolds
-        with tab3:
+        # BEREICH 3: Projects & Scaffolds
+        def section_projects():
             st.subheader("Stammdaten")
             c_p, c_s = st.columns(2)
             with c_p:
@@ -485,7 +640,10 @@ else:
                 with st.form("np"):
                     np = st.text_input("Name")
                     if st.form_submit_button("Erstellen"):
-                        if np: run_query("INSERT INTO projects (name) VALUES (?)", (np,)); st.rerun()
+                        if np:
+                            res = run_query("INSERT INTO projects (name) VALUES (?)", (np,))
+                            if res is True: st.rerun()
+                            else: st.error(f"Nicht gespeichert: {res}")
                 st.dataframe(get_data("SELECT * FROM projects"), hide_index=True)
             with c_s:
                 st.markdown("### Gerüste (Übersicht)")
@@ -498,13 +656,14 @@ else:
                             nn = st.text_input("Nummer")
                             nd = st.text_input("Beschreibung")
                             if st.form_submit_button("Speichern"):
-                                run_query("INSERT INTO scaffolds (project_id, number, description, weight_to, material_cost) VALUES (?, ?, ?, 0, 0)", (pm[cp], nn, nd))
-                                st.rerun()
+                                res = run_query("INSERT INTO scaffolds (project_id, number, description, weight_to, material_cost) VALUES (?, ?, ?, 0, 0)", (pm[cp], nn, nd))
+                                if res is True: st.rerun()
+                                else: st.error(f"Nicht gespeichert: {res}")
                     sdf = get_data("SELECT number, description FROM scaffolds WHERE project_id=?", (pm[cp],))
                     st.dataframe(sdf, hide_index=True, use_container_width=True)
 
-        # TAB 4: IMPORT (TRANSACTIONAL & SECURE)
-        with tab4:
+        # BEREICH 4: IMPORT (TRANSACTIONAL & SECURE)
+        def section_import():
             st.subheader("📥 Excel-Import (Projekt-Zuordnung + Logs)")
             
             st.divider()
@@ -527,6 +686,16 @@ else:
                             time.sleep(1)
                             st.rerun()
 
+                        st.markdown("### 📊 KPI-Rollups")
+                        if st.button("Rollups neu aufbauen", key="btn_rebuild_rollups"):
+                            run_write(rebuild_rollups, group=False)
+                            st.success("Rollups neu aufgebaut!")
+
+                        st.markdown("### 🗂️ Analyse-Snapshot")
+                        if st.button("Snapshot neu aufbauen", key="btn_rebuild_snapshot"):
+                            snap = refresh_snapshot(force=True)
+                            st.success(f"Snapshot neu aufgebaut ({snap['rows']} Buchungen).")
+
                     with col_db2:
                         st.markdown("### 📜 Import-Protokoll")
                         if 'import_logs' in st.session_state:
@@ -536,6 +705,12 @@ else:
                                 st.rerun()
                         else:
                             st.info("Keine Logs vorhanden.")
+
+                    cs = cache_stats()
+                    st.caption(f"⚡ Query-Cache: {cs['hits']} Treffer / {cs['misses']} Fehlzugriffe ({cs['hit_rate']:.0%}), "
+                               f"{cs['entries']} Einträge, {cs['bytes'] / 1e6:.1f} MB, {cs['evictions']} verdrängt, {cs['invalidations']} invalidiert")
+
+                    render_profile_panel()
                 elif db_password:
                     st.error("Falsches Passwort!")
             
@@ -544,106 +719,23 @@ else:
             uploaded_file = st.file_uploader("Datei hochladen (z.B. 02-016_Projekt.xlsx)", type=['xlsx'])
             
             if uploaded_file:
-                if st.button("Start Import"):
+                full_import = st.checkbox("Alle Zeilen prüfen (auch unveränderte seit dem letzten Import)", key="import_full",
+                                          help="Standard: Nur neue/geänderte Zeilen werden verarbeitet, eine unveränderte Datei wird übersprungen.")
+                c1, c2 = st.columns(2)
+                if c1.button("Start Import"):
+                    # Import läuft im Hintergrund (import_jobs.py), Uploads werden nacheinander verarbeitet
+                    st.session_state['import_job'] = get_runner().submit(uploaded_file.name, uploaded_file.getvalue(), incremental=not full_import)
+                    st.rerun()
+                if c2.button("🔍 Vorschau (Dry-Run)", key="btn_preview_import"):
                     try:
-                        filename = uploaded_file.name
-                        match = re.match(r'^([\d-]+)', filename)
-                        logs = []
-                        
-                        if match:
-                            proj_prefix = match.group(1)
-                            # Single Transaction
-                            conn = sqlite3.connect(DB_FILE)
-                            c = conn.cursor()
-                            
-                            # Check/Create Project
-                            c.execute("SELECT id, name FROM projects WHERE name LIKE ?", (f"{proj_prefix}%",))
-                            res = c.fetchone()
-                            if res:
-                                target_pid, target_pname = res
-                                logs.append(f"✅ Projekt gefunden: {target_pname} (ID: {target_pid})")
-                            else:
-                                c.execute("INSERT INTO projects (name) VALUES (?)", (proj_prefix,))
-                                target_pid = c.lastrowid
-                                target_pname = proj_prefix
-                                logs.append(f"🆕 Neues Projekt erstellt: {target_pname} (ID: {target_pid})")
-
-                            xl = pd.ExcelFile(uploaded_file)
-                            sheet_names = xl.sheet_names
-                            
-                            # 1. GERÜSTE
-                            if 'Gerüste' in sheet_names:
-                                logs.append("--- Tab 'Gerüste' ---")
-                                df_scaf = pd.read_excel(uploaded_file, sheet_name='Gerüste')
-                                df_scaf.columns = df_scaf.columns.str.strip()
-                                
-                                count_scaf = 0
-                                for index, row in df_scaf.iterrows():
-                                    s_num = clean_scaffold_number(row.get('Gerüstnummer', ''))
-                                    s_m3 = safe_float(get_col_val(row, ['m3', 'm³', 'Volumen']))
-                                    s_m2 = safe_float(get_col_val(row, ['m2', 'm²', 'Fläche']))
-                                    s_to = safe_float(row.get('to'))
-                                    s_mat = safe_float(row.get('Materialwert'))
-                                    s_desc = str(row.get('Beschreibung', '')) if pd.notna(row.get('Beschreibung')) else ""
-                                    s_acc = str(row.get('ACC', '')) if pd.notna(row.get('ACC')) else ""
-                                    
-                                    log_entry = f"Z.{index+2} [{s_num}]: "
-                                    if s_num and s_num != 'nan':
-                                        try:
-                                            # Try INSERT
-                                            c.execute("""
-                                                INSERT INTO scaffolds (project_id, number, description, volume_m3, area_m2, weight_to, material_cost, acc) 
-                                                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                                            """, (target_pid, s_num, s_desc, s_m3, s_m2, s_to, s_mat, s_acc))
-                                            log_entry += "OK (NEU)"
-                                            count_scaf += 1
-                                        except sqlite3.IntegrityError:
-                                            # If exists -> UPDATE
-                                            c.execute("""
-                                                UPDATE scaffolds SET description=?, volume_m3=?, area_m2=?, weight_to=?, material_cost=?, acc=? 
-                                                WHERE project_id=? AND number=?
-                                            """, (s_desc, s_m3, s_m2, s_to, s_mat, s_acc, target_pid, s_num))
-                                            log_entry += "OK (UPDATED)"
-                                            count_scaf += 1
-                                    else: log_entry += "Ignoriert (Keine Nummer)"
-                                    logs.append(log_entry)
-                                logs.append(f"--> {count_scaf} Gerüste verarbeitet.")
-
-                            # 2. STUNDEN
-                            if 'Stundenübersicht' in sheet_names:
-                                logs.append("\n--- Tab 'Stundenübersicht' ---")
-                                df_hours = pd.read_excel(uploaded_file, sheet_name='Stundenübersicht')
-                                df_hours.columns = df_hours.columns.str.strip()
-                                count_hours, count_skip = 0, 0
-                                for index, row in df_hours.iterrows():
-                                    raw_date = row.get('Datum')
-                                    if pd.isna(raw_date): w_date = date.today()
-                                    else: w_date = pd.to_datetime(raw_date).date()
-                                    u_name = str(row.get('Name', 'Importiert')).strip()
-                                    s_num = clean_scaffold_number(row.get('Gerüstnummer', ''))
-                                    h_val = parse_hours(row.get('Stunden'))
-                                    comm = str(row.get('Anmerkungen', '')) if pd.notna(row.get('Anmerkungen')) else ""
-                                    ver = str(row.get('Versionsnummer', '')) if pd.notna(row.get('Versionsnummer')) else ""
-                                    
-                                    if s_num:
-                                        c.execute("SELECT id FROM work_logs WHERE user_name=? AND project_name=? AND scaffold_number=? AND work_date=? AND hours=? AND comment=? AND version=?", 
-                                                           (u_name, target_pname, s_num, w_date, h_val, comm, ver))
-                                        if not c.fetchone():
-                                            c.execute("INSERT INTO work_logs (user_name, project_name, scaffold_number, work_date, hours, comment, version) VALUES (?, ?, ?, ?, ?, ?, ?)", 
-                                                      (u_name, target_pname, s_num, w_date, h_val, comm, ver))
-                                            count_hours += 1
-                                        else: count_skip += 1
-                                logs.append(f"--> {count_hours} Stunden importiert ({count_skip} Duplikate).")
-
-                            conn.commit() # FINAL COMMIT
-                            conn.close()
-                            
-                            st.session_state['import_logs'] = logs
-                            st.rerun()
-                            
-                    except Exception as e:
-                        if 'conn' in locals(): conn.close()
-                        st.error(f"Kritischer Fehler: {e}")
+                        with st.spinner("Datei wird gelesen und mit der Datenbank verglichen..."):
+                            st.session_state['import_preview'] = preview_import(uploaded_file.name, uploaded_file.getvalue())
+                    except Exception as e: st.error(f"Vorschau nicht möglich: {e}")
+
+            if 'import_preview' in st.session_state: import_preview_panel(st.session_state['import_preview'])
+
+            polling = get_runner().busy()
+            st.fragment(import_jobs_panel, run_every=1 if polling else None)(polling)
 
             if 'import_logs' in st.session_state:
                 with st.expander("🔍 Detaillierte Import-Logs", expanded=True):
@@ -651,4 +743,12 @@ else:
                 if st.button("Logs schließen"):
                     del st.session_state['import_logs']; st.rerun()
 
+        # Statt st.tabs (führt alle Bereiche bei jedem Rerun aus) wird nur der gewählte
+        # Bereich ausgeführt, und zwar als Fragment: Interaktionen darin laufen ohne
+        # Kopfzeile, Sidebar und die anderen Bereiche neu
+        sections = [section_master, section_kpi, section_workers, section_projects, section_import]
+        st.fragment(dict(zip(ADMIN_SECTIONS, sections))[section])()
+
+st.session_state['rerun_profile'] = finish_rerun()
+
 st.markdown("""<div class="footer"><p>Sergey Romanov, 2025 | Developed for promaintain®</p></div>""", unsafe_allow_html=True)
\ No newline at end of file
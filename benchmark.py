@@ -0,0 +1,144 @@
+import argparse
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import db
+from seed_db import seed_data
+from queries import load_master, load_details, load_details_page, load_details_summary, load_project_totals, load_project_worker_hours, load_project_scaffold_hours
+from excel_export import to_excel, write_workbook
+from import_jobs import run_import
+
+# --- BENCHMARK ---
+# Misst die echten Code-Pfade (queries.py, excel_export.py, Import-Engine) auf
+# generierten Datenbanken verschiedener Größe und schreibt die Zeiten als JSON,
+# damit Regressionen zwischen Commits vergleichbar sind.
+#   python benchmark.py --scales small,medium --out benchmark_results.json
+SCALES = {
+    'small':  dict(projects=10, scaffolds=20, workers=20, days=60, per_day=2),     # 2 400 Buchungen
+    'medium': dict(projects=50, scaffolds=50, workers=100, days=250, per_day=2),   # 50 000 Buchungen
+    'large':  dict(projects=200, scaffolds=100, workers=300, days=365, per_day=5), # 547 500 Buchungen
+}
+
+def timed(fn, repeat):
+    # Query-Cache vor jedem Lauf leeren -> gemessen wird SQLite, nicht der Cache
+    times, result = [], None
+    for _ in range(repeat):
+        db.query_cache.clear()
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return times, result
+
+def result_rows(result):
+    if isinstance(result, pd.DataFrame): return len(result)
+    if isinstance(result, tuple) and result and isinstance(result[0], pd.DataFrame): return len(result[0])
+    return None
+
+def import_workbook(rows, seed_rows):
+    # Stundenübersicht aus vorhandenen Buchungen (neue Kommentare -> keine Duplikate)
+    hours = seed_rows.sample(n=rows, replace=len(seed_rows) < rows, random_state=1).reset_index(drop=True)
+    df_hours = pd.DataFrame({'Datum': hours['Datum'], 'Name': hours['Name'], 'Gerüstnummer': hours['Gerüstnummer'],
+                             'Stunden': hours['Stunden'], 'Anmerkungen': [f"Import {i}" for i in range(rows)], 'Versionsnummer': hours['Versionsnummer']})
+    df_scaf = pd.DataFrame({'Gerüstnummer': df_hours['Gerüstnummer'].drop_duplicates(), 'Beschreibung': 'Benchmark', 'm3': 100.0, 'to': 2.5, 'Materialwert': 5000.0})
+    return write_workbook({'Gerüste': df_scaf, 'Stundenübersicht': df_hours})
+
+def run_scale(name, params, workdir, repeat, import_rows, reuse):
+    path = os.path.join(workdir, f"bench_{name}.db")
+    fresh = not (reuse and os.path.exists(path))
+    if fresh:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix): os.remove(path + suffix)
+    db.use_database(path)
+    db.ensure_schema()
+
+    results = []
+    def record(case, times, rows=None):
+        results.append({'scale': name, 'case': case, 'repeat': len(times), 'rows': rows,
+                        'min_s': round(min(times), 6), 'median_s': round(statistics.median(times), 6), 'max_s': round(max(times), 6)})
+        print(f"  {case:<22} {statistics.median(times):9.4f} s")
+
+    def measure(case, fn):
+        times, result = timed(fn, repeat)
+        record(case, times, result_rows(result))
+
+    print(f"▶ {name}: {params}")
+    if fresh:
+        start = time.perf_counter()
+        with db.get_pool().write() as conn: total = seed_data(conn, seed=42, **params)
+        record('seed', [time.perf_counter() - start], total)
+
+    project = db.get_data("SELECT name FROM projects ORDER BY id LIMIT 1").iloc[0, 0]
+    worker = db.get_data("SELECT name FROM workers ORDER BY id LIMIT 1").iloc[0, 0]
+
+    measure('master_all', lambda: load_master())
+    measure('master_project', lambda: load_master([project]))
+    measure('master_worker', lambda: load_master(workers=[worker]))
+    measure('details_all', lambda: load_details())
+    measure('details_project', lambda: load_details([project]))
+    measure('details_page', lambda: load_details_page(page_size=100))
+    measure('details_summary', lambda: load_details_summary())
+    measure('kpi_project', lambda: (load_project_totals(project), load_project_worker_hours(project), load_project_scaffold_hours(project)))
+
+    df_master = load_master()
+    df_details = load_details([project])
+    record('to_excel_master', timed(lambda: to_excel(df_master, "Gerüste"), repeat)[0], len(df_master))
+    record('to_excel_details', timed(lambda: to_excel(df_details, "Stundenübersicht"), repeat)[0], len(df_details))
+
+    if import_rows:
+        payload = import_workbook(import_rows, df_details)
+        times = []
+        for i in range(repeat):
+            # Jeder Lauf in ein neues Projekt -> gleiche Arbeit pro Lauf
+            start = time.perf_counter()
+            with db.get_pool().write() as conn:
+                run_import(conn, f"99-{i:03d}_Benchmark.xlsx", io.BytesIO(payload), [])
+            times.append(time.perf_counter() - start)
+        record('import', times, import_rows)
+    return results
+
+def git_commit():
+    try: return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception: return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark der Report-, Export- und Import-Pfade")
+    parser.add_argument("--scales", default="small,medium", help=f"Kommagetrennt aus {', '.join(SCALES)}")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--import-rows", type=int, default=10000, help="Zeilen der Import-Testdatei (0 = kein Import)")
+    parser.add_argument("--workdir", default=None, help="Ordner für die Benchmark-Datenbanken (Standard: temporär)")
+    parser.add_argument("--reuse", action="store_true", help="Vorhandene Datenbanken im workdir wiederverwenden")
+    parser.add_argument("--out", default="benchmark_results.json")
+    args = parser.parse_args(argv)
+
+    scales = [s.strip() for s in args.scales.split(",") if s.strip()]
+    unknown = [s for s in scales if s not in SCALES]
+    if unknown: parser.error(f"Unbekannte Größe: {', '.join(unknown)}")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="promaintain_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    report = {
+        'meta': {'timestamp': datetime.now().isoformat(timespec='seconds'), 'git_commit': git_commit(),
+                 'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version, 'pandas': pd.__version__,
+                 'platform': platform.platform(), 'repeat': args.repeat, 'import_rows': args.import_rows},
+        'scales': {s: SCALES[s] for s in scales},
+        'results': [],
+    }
+    for name in scales:
+        report['results'] += run_scale(name, SCALES[name], workdir, args.repeat, args.import_rows, args.reuse)
+
+    with open(args.out, "w", encoding="utf-8") as f: json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"✅ Ergebnisse gespeichert: {args.out}")
+
+if __name__ == "__main__":
+    main()
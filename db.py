@@ -0,0 +1,771 @@
+import sqlite3
+import threading
+import queue
+import atexit
+import os
+import time
+import random
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import pandas as pd
+
+from instrumentation import record_query
+
+DB_FILE = os.environ.get('PROMAINTAIN_DB_FILE', 'construction_log.db')
+
+# --- CONFIG ---
+# Werte können per Umgebungsvariable überschrieben werden, z.B. PROMAINTAIN_DB_BUSY_TIMEOUT=10000
+DB_CONFIG = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,          # ms warten statt sofort "database is locked"
+    'mmap_size': 268435456,        # 256 MB memory-mapped I/O
+    'cache_size': -65536,          # negativ = KiB -> 64 MB Page-Cache pro Verbindung
+    'read_pool_size': 4,           # max. parallele Lese-Verbindungen
+    'write_group_size': 64,        # max. Mutationen pro Transaktion (Group Commit)
+    'write_retries': 5,            # Wiederholungen bei "database is locked"
+    'write_backoff_ms': 50,        # Start-Wartezeit, verdoppelt sich pro Versuch
+}
+
+def load_config():
+    cfg = dict(DB_CONFIG)
+    for key, default in DB_CONFIG.items():
+        env_val = os.environ.get(f"PROMAINTAIN_DB_{key.upper()}")
+        if env_val is None: continue
+        cfg[key] = type(default)(env_val) if isinstance(default, int) else env_val
+    return cfg
+
+# --- CONNECTION POOL ---
+# Ein Pool pro Prozess: bleibt über Streamlit-Reruns und Sessions hinweg bestehen.
+# Schreiben läuft über genau eine Verbindung (mit Lock), Lesen über schreibgeschützte
+# Verbindungen aus einer Queue -> Dashboards blockieren keine Buchungen (WAL).
+class ConnectionPool:
+    def __init__(self, db_file=DB_FILE, config=None):
+        self.db_file = db_file
+        self.config = config or load_config()
+        self._write_lock = threading.RLock()
+        self._writer = None
+        self._readers = queue.LifoQueue()
+        self._reader_count = 0
+        self._reader_lock = threading.Lock()
+        self._version_conn = None
+        self._version_lock = threading.Lock()
+        self.generation = 0            # +1 bei jedem Commit über write()
+
+    def _apply_pragmas(self, conn):
+        cfg = self.config
+        conn.execute(f"PRAGMA busy_timeout = {int(cfg['busy_timeout'])}")
+        conn.execute(f"PRAGMA mmap_size = {int(cfg['mmap_size'])}")
+        conn.execute(f"PRAGMA cache_size = {int(cfg['cache_size'])}")
+
+    def _open_writer(self):
+        conn = sqlite3.connect(self.db_file, timeout=self.config['busy_timeout'] / 1000, check_same_thread=False)
+        conn.execute(f"PRAGMA journal_mode = {self.config['journal_mode']}")
+        conn.execute(f"PRAGMA synchronous = {self.config['synchronous']}")
+        self._apply_pragmas(conn)
+        return conn
+
+    def _open_reader(self):
+        # Datei muss existieren, sonst legt der Writer sie an (init_db)
+        if not os.path.exists(self.db_file): self.writer()
+        uri = f"file:{os.path.abspath(self.db_file)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=self.config['busy_timeout'] / 1000, check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON")
+        self._apply_pragmas(conn)
+        return conn
+
+    def writer(self):
+        with self._write_lock:
+            if self._writer is None: self._writer = self._open_writer()
+            return self._writer
+
+    @contextmanager
+    def read(self):
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._reader_lock:
+                can_open = self._reader_count < self.config['read_pool_size']
+                if can_open: self._reader_count += 1
+            if can_open:
+                try: conn = self._open_reader()
+                except Exception:
+                    with self._reader_lock: self._reader_count -= 1
+                    raise
+            else:
+                conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    @contextmanager
+    def write(self):
+        # Eine Transaktion: Commit bei Erfolg, Rollback bei Fehler
+        with self._write_lock:
+            conn = self.writer()
+            try:
+                yield conn
+                conn.commit()
+                self.generation += 1
+            except BaseException:
+                conn.rollback()
+                raise
+
+    def data_version(self):
+        # Eigene Verbindung: PRAGMA data_version ändert sich bei jedem Commit einer
+        # ANDEREN Verbindung (Writer dieses Prozesses oder andere Prozesse)
+        with self._version_lock:
+            if self._version_conn is None: self._version_conn = self._open_reader()
+            return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self):
+        with self._version_lock:
+            if self._version_conn is not None:
+                self._version_conn.close()
+                self._version_conn = None
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        while True:
+            try: self._readers.get_nowait().close()
+            except queue.Empty: break
+        with self._reader_lock: self._reader_count = 0
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+                atexit.register(_pool.close)
+    return _pool
+
+# --- SCHREIB-WARTESCHLANGE (Group Commit) ---
+# Alle Schreibzugriffe der App laufen über einen Writer-Thread: Aufrufer stellen eine
+# Mutation fn(conn) in die Queue und warten auf die Bestätigung (Future mit dem
+# Ergebnis bzw. der Exception). Was sich während eines Commits angesammelt hat, geht
+# gemeinsam in die nächste Transaktion -> ein Commit für viele Buchungen.
+# - jede Mutation läuft in einem eigenen SAVEPOINT: ein Fehler verwirft nur diese
+# - "database is locked" (z.B. andere Prozesse): ganze Gruppe zurückrollen und mit
+#   exponentiellem Backoff wiederholen
+# - group=False: Mutation läuft allein in ihrer Transaktion (Import)
+# Mutationen dürfen selbst kein run_write() aufrufen (der Writer wartet sonst auf sich).
+def _is_locked(e):
+    return isinstance(e, sqlite3.OperationalError) and ('locked' in str(e) or 'busy' in str(e))
+
+class WriteQueue:
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._held = None              # einzeln laufende Mutation für die nächste Runde
+        self._thread = threading.Thread(target=self._work, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, group=True):
+        future = Future()
+        self._queue.put((fn, group, future))
+        return future
+
+    def _next_group(self, size):
+        first, self._held = self._held or self._queue.get(), None
+        batch = [first]
+        while first[1] and len(batch) < size:
+            try: item = self._queue.get_nowait()
+            except queue.Empty: break
+            if not item[1]:
+                self._held = item; break
+            batch.append(item)
+        return batch
+
+    def _work(self):
+        while True:
+            batch = [item for item in self._next_group(get_pool().config['write_group_size']) if item[2].set_running_or_notify_cancel()]
+            # Pool erst nach dem Warten holen -> nach use_database() wird in die neue Datei geschrieben
+            if batch: self._commit(get_pool(), batch)
+
+    def _commit(self, pool, batch):
+        retries, backoff = pool.config['write_retries'], pool.config['write_backoff_ms'] / 1000
+        for attempt in range(retries + 1):
+            results = []
+            try:
+                with pool.write() as conn:
+                    conn.execute("BEGIN")
+                    for fn, _, _ in batch:
+                        conn.execute("SAVEPOINT mutation")
+                        try:
+                            results.append((True, fn(conn)))
+                        except Exception as e:
+                            if _is_locked(e): raise
+                            conn.execute("ROLLBACK TO mutation")
+                            results.append((False, e))
+                        conn.execute("RELEASE mutation")
+                break
+            except Exception as e:
+                if _is_locked(e) and attempt < retries:
+                    time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5)); continue
+                for _, _, future in batch: future.set_exception(e)
+                return
+        for (_, _, future), (ok, value) in zip(batch, results):
+            if ok: future.set_result(value)
+            else: future.set_exception(value)
+
+_write_queue = None
+_write_queue_lock = threading.Lock()
+
+def get_write_queue():
+    global _write_queue
+    with _write_queue_lock:
+        if _write_queue is None: _write_queue = WriteQueue()
+        return _write_queue
+
+def run_write(fn, group=True):
+    # Blockiert bis zum Commit; Fehler der Mutation kommen als Exception zurück
+    return get_write_queue().submit(fn, group).result()
+
+# --- NORMALISIERUNG (Migration 4) ---
+# work_entries speichert nur noch IDs. work_logs bleibt als View mit den alten Spalten
+# (user_name, project_name, scaffold_number) erhalten; INSTEAD-OF-Trigger leiten
+# INSERT/UPDATE/DELETE auf work_entries um und legen fehlende Stammdaten an.
+WORK_ENTRIES_DDL = """CREATE TABLE IF NOT EXISTS work_entries (
+    id INTEGER PRIMARY KEY,
+    project_id INTEGER NOT NULL REFERENCES projects(id),
+    scaffold_id INTEGER NOT NULL REFERENCES scaffolds(id),
+    worker_id INTEGER NOT NULL REFERENCES workers(id),
+    work_date DATE,
+    hours REAL,
+    comment TEXT,
+    version TEXT)"""
+
+WORK_LOGS_VIEW_DDL = """CREATE VIEW IF NOT EXISTS work_logs AS
+    SELECT e.id, k.name AS user_name, p.name AS project_name, s.number AS scaffold_number,
+           e.work_date, e.hours, e.comment, e.version
+    FROM work_entries e
+    JOIN workers k ON k.id = e.worker_id
+    JOIN projects p ON p.id = e.project_id
+    JOIN scaffolds s ON s.id = e.scaffold_id"""
+
+# Fehlende Mitarbeiter/Projekte/Gerüste anlegen (NEW.* = Textwerte aus der alten Spaltenform)
+_RESOLVE_REFS = """
+        INSERT OR IGNORE INTO workers (name) SELECT NEW.user_name WHERE NEW.user_name IS NOT NULL;
+        INSERT OR IGNORE INTO projects (name) SELECT NEW.project_name WHERE NEW.project_name IS NOT NULL;
+        INSERT OR IGNORE INTO scaffolds (project_id, number)
+            SELECT id, NEW.scaffold_number FROM projects WHERE name = NEW.project_name AND NEW.scaffold_number IS NOT NULL;"""
+
+_RESOLVED_IDS = """(SELECT id FROM projects WHERE name = NEW.project_name),
+                (SELECT s.id FROM scaffolds s JOIN projects p ON p.id = s.project_id
+                 WHERE p.name = NEW.project_name AND s.number = NEW.scaffold_number),
+                (SELECT id FROM workers WHERE name = NEW.user_name)"""
+
+WORK_LOGS_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS work_logs_insert INSTEAD OF INSERT ON work_logs
+    BEGIN{_RESOLVE_REFS}
+        INSERT INTO work_entries (id, project_id, scaffold_id, worker_id, work_date, hours, comment, version)
+        VALUES (NEW.id, {_RESOLVED_IDS},
+                NEW.work_date, NEW.hours, NEW.comment, NEW.version);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS work_logs_update INSTEAD OF UPDATE ON work_logs
+    BEGIN{_RESOLVE_REFS}
+        UPDATE work_entries SET (project_id, scaffold_id, worker_id) = ({_RESOLVED_IDS}),
+            work_date = NEW.work_date, hours = NEW.hours, comment = NEW.comment, version = NEW.version
+        WHERE id = OLD.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS work_logs_delete INSTEAD OF DELETE ON work_logs
+    BEGIN
+        DELETE FROM work_entries WHERE id = OLD.id;
+    END""",
+]
+
+WORK_ENTRIES_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_work_entries_project_scaffold ON work_entries (project_id, scaffold_id)",
+    "CREATE INDEX IF NOT EXISTS idx_work_entries_scaffold ON work_entries (scaffold_id)",
+    "CREATE INDEX IF NOT EXISTS idx_work_entries_worker ON work_entries (worker_id)",
+    "CREATE INDEX IF NOT EXISTS idx_work_entries_date ON work_entries (work_date)",
+    """CREATE INDEX IF NOT EXISTS idx_work_entries_dedup ON work_entries
+       (project_id, work_date, worker_id, scaffold_id, hours, comment, version)""",
+]
+
+UNKNOWN_NAME = "Unbekannt"         # Platzhalter für fehlende Mitarbeiter/Projekt/Gerüst-Werte
+
+def normalize_work_logs(conn):
+    c = conn.cursor()
+    # 0. Fehlende Textwerte durch Platzhalter ersetzen (NOT NULL-Fremdschlüssel in work_entries)
+    for col in ('user_name', 'project_name', 'scaffold_number'):
+        c.execute(f"UPDATE work_logs SET {col} = ? WHERE {col} IS NULL", (UNKNOWN_NAME,))
+    # 1. Stammdaten für verwaiste Textwerte anlegen (sonst gingen Stunden verloren)
+    c.execute("INSERT OR IGNORE INTO workers (name) SELECT DISTINCT user_name FROM work_logs")
+    c.execute("INSERT OR IGNORE INTO projects (name) SELECT DISTINCT project_name FROM work_logs")
+    c.execute("""INSERT OR IGNORE INTO scaffolds (project_id, number)
+                 SELECT DISTINCT p.id, w.scaffold_number FROM work_logs w JOIN projects p ON p.name = w.project_name""")
+    # 2. Daten mit IDs übernehmen (gleiche id -> Bearbeiten nach ID funktioniert weiter)
+    c.execute(WORK_ENTRIES_DDL)
+    c.execute("""INSERT INTO work_entries (id, project_id, scaffold_id, worker_id, work_date, hours, comment, version)
+                 SELECT w.id, p.id, s.id, k.id, w.work_date, w.hours, w.comment, w.version
+                 FROM work_logs w
+                 JOIN projects p ON p.name = w.project_name
+                 JOIN scaffolds s ON s.project_id = p.id AND s.number = w.scaffold_number
+                 JOIN workers k ON k.name = w.user_name""")
+    # Jede Buchung muss übernommen sein, sonst Abbruch (Rollback der Migration)
+    old_rows = c.execute("SELECT COUNT(*) FROM work_logs").fetchone()[0]
+    new_rows = c.execute("SELECT COUNT(*) FROM work_entries").fetchone()[0]
+    if old_rows != new_rows: raise RuntimeError(f"Migration work_logs -> work_entries: {old_rows} Buchungen, aber {new_rows} übernommen")
+    # 3. Alte Tabelle durch Kompatibilitäts-View ersetzen
+    c.execute("DROP TABLE work_logs")
+    c.execute(WORK_LOGS_VIEW_DDL)
+    for ddl in WORK_LOGS_TRIGGERS + WORK_ENTRIES_INDEXES: c.execute(ddl)
+
+# --- ROLLUPS (Migration 5) ---
+# Materialisierte Summen für KPI & Analytik, gepflegt durch Trigger auf work_entries
+# und scaffolds. KPI-Abfragen lesen nur noch diese Tabellen (Kosten unabhängig von
+# der Anzahl der Buchungen). rebuild_rollups() baut sie aus den Rohdaten neu auf.
+ROLLUP_DDL = [
+    """CREATE TABLE IF NOT EXISTS rollup_project_worker (
+        project_id INTEGER NOT NULL, worker_id INTEGER NOT NULL, hours REAL NOT NULL DEFAULT 0, entries INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (project_id, worker_id))""",
+    """CREATE TABLE IF NOT EXISTS rollup_project_scaffold (
+        project_id INTEGER NOT NULL, scaffold_id INTEGER NOT NULL, hours REAL NOT NULL DEFAULT 0, entries INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (project_id, scaffold_id))""",
+    """CREATE TABLE IF NOT EXISTS rollup_project (
+        project_id INTEGER PRIMARY KEY, hours REAL NOT NULL DEFAULT 0, entries INTEGER NOT NULL DEFAULT 0,
+        volume_m3 REAL NOT NULL DEFAULT 0, material_cost REAL NOT NULL DEFAULT 0, scaffold_count INTEGER NOT NULL DEFAULT 0)""",
+]
+
+def _rollup_hours_sql(row, sign):
+    # row = NEW oder OLD, sign = '+' oder '-'
+    return f"""
+        INSERT INTO rollup_project_worker (project_id, worker_id, hours, entries) VALUES ({row}.project_id, {row}.worker_id, {sign}COALESCE({row}.hours, 0), {sign}1)
+            ON CONFLICT(project_id, worker_id) DO UPDATE SET hours = hours + excluded.hours, entries = entries + excluded.entries;
+        INSERT INTO rollup_project_scaffold (project_id, scaffold_id, hours, entries) VALUES ({row}.project_id, {row}.scaffold_id, {sign}COALESCE({row}.hours, 0), {sign}1)
+            ON CONFLICT(project_id, scaffold_id) DO UPDATE SET hours = hours + excluded.hours, entries = entries + excluded.entries;
+        INSERT INTO rollup_project (project_id, hours, entries) VALUES ({row}.project_id, {sign}COALESCE({row}.hours, 0), {sign}1)
+            ON CONFLICT(project_id) DO UPDATE SET hours = hours + excluded.hours, entries = entries + excluded.entries;"""
+
+def _rollup_scaffold_sql(row, sign):
+    return f"""
+        INSERT INTO rollup_project (project_id, volume_m3, material_cost, scaffold_count)
+            VALUES ({row}.project_id, {sign}COALESCE({row}.volume_m3, 0), {sign}COALESCE({row}.material_cost, 0), {sign}1)
+            ON CONFLICT(project_id) DO UPDATE SET volume_m3 = volume_m3 + excluded.volume_m3,
+                material_cost = material_cost + excluded.material_cost, scaffold_count = scaffold_count + excluded.scaffold_count;"""
+
+_ROLLUP_CLEANUP = """
+        DELETE FROM rollup_project_worker WHERE entries = 0;
+        DELETE FROM rollup_project_scaffold WHERE entries = 0;"""
+
+ROLLUP_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS rollup_work_entries_insert AFTER INSERT ON work_entries
+    BEGIN{_rollup_hours_sql('NEW', '+')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS rollup_work_entries_delete AFTER DELETE ON work_entries
+    BEGIN{_rollup_hours_sql('OLD', '-')}{_ROLLUP_CLEANUP}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS rollup_work_entries_update AFTER UPDATE OF project_id, scaffold_id, worker_id, hours ON work_entries
+    BEGIN{_rollup_hours_sql('OLD', '-')}{_rollup_hours_sql('NEW', '+')}{_ROLLUP_CLEANUP}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS rollup_scaffolds_insert AFTER INSERT ON scaffolds
+    BEGIN{_rollup_scaffold_sql('NEW', '+')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS rollup_scaffolds_delete AFTER DELETE ON scaffolds
+    BEGIN{_rollup_scaffold_sql('OLD', '-')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS rollup_scaffolds_update AFTER UPDATE OF project_id, volume_m3, material_cost ON scaffolds
+    BEGIN{_rollup_scaffold_sql('OLD', '-')}{_rollup_scaffold_sql('NEW', '+')}
+    END""",
+]
+
+def rebuild_rollups(conn):
+    c = conn.cursor()
+    for table in ('rollup_project_worker', 'rollup_project_scaffold', 'rollup_project'): c.execute(f"DELETE FROM {table}")
+    c.execute("""INSERT INTO rollup_project_worker (project_id, worker_id, hours, entries)
+                 SELECT project_id, worker_id, COALESCE(SUM(hours), 0), COUNT(*) FROM work_entries GROUP BY project_id, worker_id""")
+    c.execute("""INSERT INTO rollup_project_scaffold (project_id, scaffold_id, hours, entries)
+                 SELECT project_id, scaffold_id, COALESCE(SUM(hours), 0), COUNT(*) FROM work_entries GROUP BY project_id, scaffold_id""")
+    c.execute("""INSERT INTO rollup_project (project_id, hours, entries)
+                 SELECT project_id, COALESCE(SUM(hours), 0), COUNT(*) FROM work_entries GROUP BY project_id""")
+    c.execute("""INSERT INTO rollup_project (project_id, volume_m3, material_cost, scaffold_count)
+                 SELECT project_id, COALESCE(SUM(volume_m3), 0), COALESCE(SUM(material_cost), 0), COUNT(*) FROM scaffolds GROUP BY project_id
+                 ON CONFLICT(project_id) DO UPDATE SET volume_m3 = excluded.volume_m3,
+                     material_cost = excluded.material_cost, scaffold_count = excluded.scaffold_count""")
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rollup_daily'").fetchone(): rebuild_daily_rollup(conn)
+
+def create_rollups(conn):
+    for ddl in ROLLUP_DDL + ROLLUP_TRIGGERS: conn.execute(ddl)
+    rebuild_rollups(conn)
+
+# --- TAGES-ROLLUP (Migration 8) ---
+# Stunden je (Projekt, Datum, Gerüst, Mitarbeiter), per Trigger gepflegt wie oben.
+# Wochen-/Monatsansichten summieren diese Tabelle -> Zeiträume lesen nur vorverdichtete
+# Zeilen (Primärschlüssel beginnt mit project_id, work_date -> Bereichs-Scan).
+ROLLUP_DAILY_DDL = [
+    """CREATE TABLE IF NOT EXISTS rollup_daily (
+        project_id INTEGER NOT NULL, work_date TEXT NOT NULL, scaffold_id INTEGER NOT NULL, worker_id INTEGER NOT NULL,
+        hours REAL NOT NULL DEFAULT 0, entries INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (project_id, work_date, scaffold_id, worker_id)) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS idx_rollup_daily_date ON rollup_daily (work_date)",
+]
+
+def _rollup_daily_sql(row, sign):
+    return f"""
+        INSERT INTO rollup_daily (project_id, work_date, scaffold_id, worker_id, hours, entries)
+            VALUES ({row}.project_id, COALESCE({row}.work_date, ''), {row}.scaffold_id, {row}.worker_id, {sign}COALESCE({row}.hours, 0), {sign}1)
+            ON CONFLICT(project_id, work_date, scaffold_id, worker_id) DO UPDATE SET hours = hours + excluded.hours, entries = entries + excluded.entries;"""
+
+_ROLLUP_DAILY_CLEANUP = """
+        DELETE FROM rollup_daily WHERE entries = 0;"""
+
+ROLLUP_DAILY_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS rollup_daily_insert AFTER INSERT ON work_entries
+    BEGIN{_rollup_daily_sql('NEW', '+')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS rollup_daily_delete AFTER DELETE ON work_entries
+    BEGIN{_rollup_daily_sql('OLD', '-')}{_ROLLUP_DAILY_CLEANUP}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS rollup_daily_update AFTER UPDATE OF project_id, scaffold_id, worker_id, work_date, hours ON work_entries
+    BEGIN{_rollup_daily_sql('OLD', '-')}{_rollup_daily_sql('NEW', '+')}{_ROLLUP_DAILY_CLEANUP}
+    END""",
+]
+
+def rebuild_daily_rollup(conn):
+    conn.execute("DELETE FROM rollup_daily")
+    conn.execute("""INSERT INTO rollup_daily (project_id, work_date, scaffold_id, worker_id, hours, entries)
+                    SELECT project_id, COALESCE(work_date, ''), scaffold_id, worker_id, COALESCE(SUM(hours), 0), COUNT(*)
+                    FROM work_entries GROUP BY project_id, COALESCE(work_date, ''), scaffold_id, worker_id""")
+
+def create_daily_rollup(conn):
+    for ddl in ROLLUP_DAILY_DDL + ROLLUP_DAILY_TRIGGERS: conn.execute(ddl)
+    rebuild_daily_rollup(conn)
+
+# --- IMPORT-JOBS ---
+# Status der Hintergrund-Importe (import_jobs.py). Logs bleiben nach dem Import erhalten.
+IMPORT_JOBS_DDL = """CREATE TABLE IF NOT EXISTS import_jobs (
+    id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    status TEXT NOT NULL,              -- running | done | failed (Warteschlange nur im Speicher)
+    stage TEXT,
+    rows_scaffolds INTEGER NOT NULL DEFAULT 0,
+    rows_hours INTEGER NOT NULL DEFAULT 0,
+    logs TEXT,
+    error TEXT,
+    created_at TEXT,
+    started_at TEXT,
+    finished_at TEXT)"""
+
+# --- IMPORT-STAND (Migration 9) ---
+# Je Projekt-Präfix (Dateiname) und Blatt: Hash und Zeilen-Fingerprints des letzten
+# Imports. sheet = '' steht für die ganze Datei. project_id: Wird das Projekt gelöscht
+# und neu angelegt, passt der Stand nicht mehr und die Datei wird voll importiert.
+IMPORT_STATE_DDL = [
+    """CREATE TABLE IF NOT EXISTS import_files (
+        prefix TEXT NOT NULL,
+        sheet TEXT NOT NULL,
+        project_id INTEGER NOT NULL,
+        hash TEXT NOT NULL,
+        rows INTEGER NOT NULL DEFAULT 0,
+        imported_at TEXT,
+        PRIMARY KEY (prefix, sheet))""",
+    """CREATE TABLE IF NOT EXISTS import_fingerprints (
+        prefix TEXT NOT NULL,
+        sheet TEXT NOT NULL,
+        fingerprint INTEGER NOT NULL,
+        PRIMARY KEY (prefix, sheet, fingerprint)) WITHOUT ROWID""",
+    "ALTER TABLE import_jobs ADD COLUMN rows_skipped INTEGER NOT NULL DEFAULT 0",
+]
+
+# --- ÄNDERUNGSZÄHLER (Migration 7) ---
+# Zählen Änderungen, die sich nicht an einer neuen id erkennen lassen (UPDATE/DELETE,
+# Umbenennungen). snapshot.py baut bei geändertem Zähler neu auf statt inkrementell.
+CHANGE_COUNTERS_DDL = "CREATE TABLE IF NOT EXISTS change_counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)"
+
+def _bump(*names):
+    return " ".join(f"UPDATE change_counters SET value = value + 1 WHERE name = '{n}';" for n in names)
+
+CHANGE_COUNTER_TRIGGERS = [
+    f"CREATE TRIGGER IF NOT EXISTS trg_changes_entries_upd AFTER UPDATE ON work_entries BEGIN {_bump('work_logs')} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_changes_entries_del AFTER DELETE ON work_entries BEGIN {_bump('work_logs')} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_changes_workers_upd AFTER UPDATE OF name ON workers BEGIN {_bump('work_logs')} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_changes_workers_del AFTER DELETE ON workers BEGIN {_bump('work_logs')} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_changes_projects_upd AFTER UPDATE OF name ON projects BEGIN {_bump('work_logs', 'scaffolds')} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_changes_projects_del AFTER DELETE ON projects BEGIN {_bump('work_logs', 'scaffolds')} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_changes_scaffolds_ins AFTER INSERT ON scaffolds BEGIN {_bump('scaffolds')} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_changes_scaffolds_upd AFTER UPDATE ON scaffolds BEGIN {_bump('scaffolds')} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_changes_scaffolds_renum AFTER UPDATE OF number ON scaffolds BEGIN {_bump('work_logs')} END",
+    f"CREATE TRIGGER IF NOT EXISTS trg_changes_scaffolds_del AFTER DELETE ON scaffolds BEGIN {_bump('work_logs', 'scaffolds')} END",
+]
+
+def create_change_counters(conn):
+    conn.execute(CHANGE_COUNTERS_DDL)
+    conn.executemany("INSERT OR IGNORE INTO change_counters (name) VALUES (?)", [('work_logs',), ('scaffolds',)])
+    # Zufällige Kennung pro angelegter DB: nach einem Reset passt kein alter Snapshot mehr
+    conn.execute("INSERT OR IGNORE INTO change_counters (name, value) VALUES ('epoch', abs(random()))")
+    for ddl in CHANGE_COUNTER_TRIGGERS: conn.execute(ddl)
+
+# --- VOLLTEXTSUCHE (Migration 10) ---
+# FTS5-Index über Anmerkungen, Version und Gerüst-Beschreibung, eine Zeile pro Buchung
+# (rowid = work_entries.id). Die Beschreibung wird mitgeführt, damit ein Treffer nur
+# einen Index-Lookup braucht; Trigger halten beides synchron.
+SEARCH_INDEX_DDL = """CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+    comment, version, description, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"""
+
+_SEARCH_ROW = "NEW.comment, NEW.version, (SELECT description FROM scaffolds WHERE id = NEW.scaffold_id)"
+SEARCH_INDEX_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS search_index_insert AFTER INSERT ON work_entries
+    BEGIN INSERT INTO search_index (rowid, comment, version, description) VALUES (NEW.id, {_SEARCH_ROW}); END""",
+    """CREATE TRIGGER IF NOT EXISTS search_index_delete AFTER DELETE ON work_entries
+    BEGIN DELETE FROM search_index WHERE rowid = OLD.id; END""",
+    f"""CREATE TRIGGER IF NOT EXISTS search_index_update AFTER UPDATE OF comment, version, scaffold_id ON work_entries
+    BEGIN UPDATE search_index SET (comment, version, description) = ({_SEARCH_ROW}) WHERE rowid = NEW.id; END""",
+    # Import-Upserts setzen die Beschreibung auch unverändert -> nur echte Änderungen
+    """CREATE TRIGGER IF NOT EXISTS search_index_scaffold AFTER UPDATE OF description ON scaffolds
+    WHEN OLD.description IS NOT NEW.description
+    BEGIN UPDATE search_index SET description = NEW.description WHERE rowid IN (SELECT id FROM work_entries WHERE scaffold_id = NEW.id); END""",
+]
+
+def rebuild_search_index(conn):
+    conn.execute("DELETE FROM search_index")
+    conn.execute("""INSERT INTO search_index (rowid, comment, version, description)
+                    SELECT e.id, e.comment, e.version, s.description FROM work_entries e LEFT JOIN scaffolds s ON s.id = e.scaffold_id""")
+
+def create_search_index(conn):
+    conn.execute(SEARCH_INDEX_DDL)
+    for ddl in SEARCH_INDEX_TRIGGERS: conn.execute(ddl)
+    rebuild_search_index(conn)
+
+# --- MIGRATIONS ---
+# Schema-Version liegt in PRAGMA user_version. Neue Änderungen immer HINTEN anhängen,
+# bestehende Einträge nie ändern (bereits migrierte DBs würden sie nicht erneut ausführen).
+# Ein Schritt ist entweder SQL oder eine Funktion f(conn).
+MIGRATIONS = [
+    (1, "Index work_logs (Projekt, Gerüst) für Master-Join und KPI", [
+        "CREATE INDEX IF NOT EXISTS idx_work_logs_project_scaffold ON work_logs (project_name, scaffold_number)",
+    ]),
+    (2, "Indizes work_logs (Mitarbeiter) und (Datum)", [
+        "CREATE INDEX IF NOT EXISTS idx_work_logs_user ON work_logs (user_name)",
+        "CREATE INDEX IF NOT EXISTS idx_work_logs_date ON work_logs (work_date)",
+    ]),
+    (3, "Covering-Index für die Duplikat-Prüfung beim Import", [
+        """CREATE INDEX IF NOT EXISTS idx_work_logs_dedup ON work_logs
+           (project_name, work_date, user_name, scaffold_number, hours, comment, version)""",
+    ]),
+    (4, "work_logs normalisieren -> work_entries mit Integer-Fremdschlüsseln", [
+        normalize_work_logs,
+    ]),
+    (5, "Rollup-Tabellen für KPI & Analytik (per Trigger gepflegt)", [
+        create_rollups,
+    ]),
+    (6, "Job-Tabelle für Hintergrund-Importe", [
+        IMPORT_JOBS_DDL,
+        "CREATE INDEX IF NOT EXISTS idx_import_jobs_created ON import_jobs (created_at)",
+    ]),
+    (7, "Änderungszähler für den Analyse-Snapshot", [
+        create_change_counters,
+    ]),
+    (8, "Tages-Rollup (Datum, Projekt, Gerüst, Mitarbeiter) für Zeitreihen", [
+        create_daily_rollup,
+    ]),
+    (9, "Import-Stand (Datei-/Blatt-Hashes, Zeilen-Fingerprints) für inkrementelle Importe", IMPORT_STATE_DDL),
+    (10, "Volltextsuche (FTS5) über Anmerkungen, Version, Gerüst-Beschreibung", [
+        create_search_index,
+    ]),
+]
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    current = get_schema_version(conn)
+    applied = []
+    for version, desc, steps in MIGRATIONS:
+        if version <= current: continue
+        # Jede Migration atomar, inkl. Versionsnummer
+        if not conn.in_transaction: conn.execute("BEGIN")
+        for step in steps:
+            if callable(step): step(conn)
+            else: conn.execute(step)
+        conn.execute(f"PRAGMA user_version = {int(version)}")
+        conn.commit()
+        applied.append((version, desc))
+    return applied
+
+# --- DB INIT ---
+_schema_ready = False
+
+def init_db(force_reset=False):
+    global _schema_ready
+    with get_pool().write() as conn:
+        c = conn.cursor()
+        if force_reset:
+            # Alles löschen, was Migrationen angelegt haben (Views zuerst, dann virtuelle Tabellen
+            # samt ihrer Schatten-Tabellen, Trigger/Indizes fallen mit)
+            objects = c.execute("""SELECT type, name FROM sqlite_master WHERE type IN ('view', 'table') AND name NOT LIKE 'sqlite_%'
+                                   ORDER BY type = 'table', sql NOT LIKE 'CREATE VIRTUAL TABLE%'""").fetchall()
+            for obj_type, name in objects:
+                c.execute(f'DROP {obj_type.upper()} IF EXISTS "{name}"')
+            c.execute("PRAGMA user_version = 0")
+
+        c.execute('''CREATE TABLE IF NOT EXISTS projects (id INTEGER PRIMARY KEY, name TEXT UNIQUE)''')
+        c.execute('''CREATE TABLE IF NOT EXISTS workers (id INTEGER PRIMARY KEY, name TEXT UNIQUE, position TEXT)''')
+        c.execute('''CREATE TABLE IF NOT EXISTS scaffolds (
+            id INTEGER PRIMARY KEY,
+            project_id INTEGER NOT NULL,
+            number TEXT,
+            description TEXT,
+            volume_m3 REAL,
+            area_m2 REAL,
+            weight_to REAL,
+            material_cost REAL,
+            acc TEXT,
+            FOREIGN KEY(project_id) REFERENCES projects(id),
+            UNIQUE(project_id, number))''')
+        c.execute('''CREATE TABLE IF NOT EXISTS work_logs (id INTEGER PRIMARY KEY, user_name TEXT, project_name TEXT, scaffold_number TEXT, work_date DATE, hours REAL, comment TEXT, version TEXT)''')
+        migrate(conn)
+    _schema_ready = True
+
+def ensure_schema():
+    # Einmal pro Prozess: legt fehlende Tabellen an und migriert bestehende DBs
+    if not _schema_ready: init_db()
+
+# --- QUERY CACHE ---
+# Ergebnisse von get_data() pro (SQL, Parameter) im Speicher, LRU mit Limit für
+# Anzahl und Größe. Gültig, solange sich die Datenversion nicht ändert:
+# Schreib-Generation des Pools (run_query, Import) + PRAGMA data_version (andere Prozesse).
+CACHE_MAX_ENTRIES = 256
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+class QueryCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries: self.stats['invalidations'] += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+
+    def get(self, key, version):
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[0]
+
+    def put(self, key, version, df):
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes // 4: return
+        with self._lock:
+            self._check_version(version)
+            if key in self._entries: self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (df, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, old_size) = self._entries.popitem(last=False)
+                self._bytes -= old_size
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def info(self):
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return dict(self.stats, entries=len(self._entries), bytes=self._bytes,
+                        hit_rate=self.stats['hits'] / lookups if lookups else 0.0)
+
+query_cache = QueryCache()
+
+def cache_version():
+    pool = get_pool()
+    return (pool.generation, pool.data_version())
+
+def cache_stats():
+    return query_cache.info()
+
+# --- TYPISIERTES LADEN ---
+# get_data(..., typed=True): wiederkehrende Texte (Namen, Projekte, Gerüstnummern,
+# Datum) als category, übrige Texte als Arrow-Strings; Zahlen verlustfrei verkleinert
+# (float32 nur, wenn jeder Wert exakt darstellbar ist). Gilt auch für den Query-Cache.
+CATEGORY_MAX_RATIO = 0.5           # category, wenn verschiedene Werte <= 50 % der Zeilen
+
+def compact_frame(df):
+    for col in df.columns:
+        s = df[col]
+        if s.dtype == object:
+            if pd.api.types.infer_dtype(s, skipna=True) != 'string': continue
+            df[col] = s.astype('category') if s.nunique() <= CATEGORY_MAX_RATIO * len(s) else s.astype('string[pyarrow]')
+        elif pd.api.types.is_float_dtype(s):
+            f32 = s.astype('float32')
+            if ((f32.astype('float64') == s) | s.isna()).all(): df[col] = f32
+        elif pd.api.types.is_integer_dtype(s):
+            df[col] = pd.to_numeric(s, downcast='integer')
+    return df
+
+# --- QUERY HELPERS ---
+def get_data(query, params=(), cache=True, typed=False):
+    key = (query, tuple(params), typed)
+    start = time.perf_counter()
+    if cache:
+        version = cache_version()
+        df = query_cache.get(key, version)
+        # Kopie zurückgeben: Aufrufer ergänzen Spalten (z.B. 'disp')
+        if df is not None:
+            record_query('sql', query, params, time.perf_counter() - start, len(df), cached=True)
+            return df.copy()
+    with get_pool().read() as conn:
+        df = pd.read_sql_query(query, conn, params=params)
+        record_query('sql', query, params, time.perf_counter() - start, len(df), conn=conn)
+    if typed: df = compact_frame(df)
+    if cache: query_cache.put(key, version, df.copy())
+    return df
+
+def data_version():
+    return get_pool().data_version()
+
+def use_database(db_file):
+    # Auf eine andere DB-Datei umschalten (seed_db.py, benchmark.py): Pool, Schema-Status
+    # und Query-Cache zurücksetzen, damit keine Ergebnisse der alten Datei geliefert werden
+    global _pool, _schema_ready, DB_FILE
+    with _pool_lock:
+        if _pool is not None: _pool.close()
+        DB_FILE = db_file
+        _pool = ConnectionPool(db_file)
+        atexit.register(_pool.close)
+    _schema_ready = False
+    query_cache.clear()
+
+def run_query(query, params=()):
+    # Über die Schreib-Warteschlange; gemessen inkl. Wartezeit bis zum Commit
+    try:
+        start = time.perf_counter()
+        rows = run_write(lambda conn: conn.execute(query, params).rowcount)
+        record_query('sql_write', query, params, time.perf_counter() - start, rows)
+        return True
+    except Exception as e:
+        return str(e)
+
+if __name__ == "__main__":
+    import sys
+    ensure_schema()
+    if sys.argv[1:] == ['rebuild-rollups']:
+        with get_pool().write() as conn: rebuild_rollups(conn)
+        print("✅ Rollups neu aufgebaut.")
+    elif sys.argv[1:] == ['rebuild-search']:
+        with get_pool().write() as conn: rebuild_search_index(conn)
+        print("✅ Suchindex neu aufgebaut.")
+    else:
+        print("Verwendung: python db.py rebuild-rollups | rebuild-search")
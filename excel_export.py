@@ -0,0 +1,80 @@
+import io
+from datetime import date, datetime, time
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import NamedStyle, PatternFill, Border, Side, Font, Alignment
+from openpyxl.utils import get_column_letter
+
+from instrumentation import timer
+
+# --- EXPORT ENGINE ---
+# Ein Durchlauf im openpyxl write_only-Modus. Formatierung über Named Styles
+# (einmal pro Workbook registriert) statt neuer Style-Objekte pro Zelle.
+# Optik wie bisher: graue fette Kopfzeile, dünne Rahmen, Zahlen rechts, Text links.
+THIN = Side(style='thin')
+THIN_BORDER = Border(left=THIN, right=THIN, top=THIN, bottom=THIN)
+
+def _named_styles():
+    header = NamedStyle(name='pm_header', font=Font(bold=True), border=THIN_BORDER,
+                        fill=PatternFill(start_color="E0E0E0", end_color="E0E0E0", fill_type="solid"),
+                        alignment=Alignment(horizontal='center', vertical='center'))
+    number = NamedStyle(name='pm_number', border=THIN_BORDER, alignment=Alignment(horizontal='right'))
+    text = NamedStyle(name='pm_text', border=THIN_BORDER, alignment=Alignment(horizontal='left'))
+    dt = NamedStyle(name='pm_datetime', border=THIN_BORDER, alignment=Alignment(horizontal='left'), number_format='YYYY-MM-DD HH:MM:SS')
+    d = NamedStyle(name='pm_date', border=THIN_BORDER, alignment=Alignment(horizontal='left'), number_format='YYYY-MM-DD')
+    t = NamedStyle(name='pm_time', border=THIN_BORDER, alignment=Alignment(horizontal='left'), number_format='HH:MM:SS')
+    return [header, number, text, dt, d, t]
+
+def _style_for(value):
+    if isinstance(value, (int, float)): return 'pm_number'
+    if isinstance(value, datetime): return 'pm_datetime'
+    if isinstance(value, date): return 'pm_date'
+    if isinstance(value, time): return 'pm_time'
+    return 'pm_text'
+
+def column_widths(df):
+    # Vektorisiert: längster Text je Spalte (inkl. Kopfzeile), gleiche Formel wie bisher
+    widths = []
+    for col in df.columns:
+        max_len = len(str(col))
+        if len(df): max_len = max(max_len, int(df[col].astype(str).str.len().max()))
+        widths.append((max_len + 2) * 1.1)
+    return widths
+
+def _write_sheet(wb, df, sheet_name):
+    ws = wb.create_sheet(title=sheet_name)
+    for idx, width in enumerate(column_widths(df), start=1):
+        ws.column_dimensions[get_column_letter(idx)].width = width
+
+    header = []
+    for col in df.columns:
+        cell = WriteOnlyCell(ws, value=str(col))
+        cell.style = 'pm_header'
+        header.append(cell)
+    ws.append(header)
+
+    # NaN -> leere Zelle (mit Rahmen), wie pandas.to_excel
+    values = df.astype(object).where(df.notna(), None)
+    for row in values.itertuples(index=False, name=None):
+        cells = []
+        for value in row:
+            if isinstance(value, pd.Timestamp): value = value.to_pydatetime()
+            cell = WriteOnlyCell(ws, value=value)
+            cell.style = _style_for(value)
+            cells.append(cell)
+        ws.append(cells)
+
+def write_workbook(sheets):
+    # sheets: {Blattname: DataFrame}, Reihenfolge = Reihenfolge der Blätter
+    with timer('excel', "to_excel: " + ", ".join(sheets)):
+        wb = Workbook(write_only=True)
+        for style in _named_styles(): wb.add_named_style(style)
+        for sheet_name, df in sheets.items(): _write_sheet(wb, df, sheet_name)
+        output = io.BytesIO()
+        wb.save(output)
+        return output.getvalue()
+
+def to_excel(df, sheet_name='Report'):
+    return write_workbook({sheet_name: df})
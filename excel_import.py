@@ -0,0 +1,370 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+from datetime import date, time as dt_time, datetime
+from openpyxl import load_workbook
+
+# --- HELPER FUNCTIONS (spaltenweise) ---
+def pick_col(df, possibilities):
+    for col in possibilities:
+        if col in df.columns: return df[col]
+    return pd.Series([None] * len(df), index=df.index, dtype=object)
+
+def safe_float_col(col):
+    if pd.api.types.is_numeric_dtype(col): return col.astype(float).fillna(0.0)
+    txt = col.astype('string').str.replace(',', '.', regex=False).str.replace(' ', '', regex=False).str.strip()
+    return pd.to_numeric(txt, errors='coerce').fillna(0.0).astype(float)
+
+def clean_scaffold_number_col(col):
+    s = col.astype('string').str.strip().fillna("")
+    return s.where(~s.str.endswith(".0"), s.str[:-2]).astype(object)
+
+def text_col(col):
+    return col.where(col.notna(), "").astype(str)
+
+# --- ZEILEN-FINGERPRINTS (inkrementeller Import) ---
+# 64-Bit-Hash je normalisierter Zeile (pd.util.hash_pandas_object, fester Schlüssel
+# -> stabil zwischen Läufen). Zeilen, deren Fingerprint schon im letzten Import des
+# Projekts vorkam, werden übersprungen; die aktuellen Fingerprints ersetzen danach
+# den gespeicherten Stand.
+def row_fingerprints(df, columns):
+    return pd.Series(pd.util.hash_pandas_object(df[columns], index=False).values.view('int64'), index=df.index)
+
+class RowFingerprints:
+    def __init__(self, known=()):
+        self.known = np.fromiter(known, dtype='int64')
+        self.current = []
+        self.skipped = 0
+
+    def filter(self, df, columns):
+        fp = row_fingerprints(df, columns)
+        self.current.append(fp.values)
+        fresh = ~np.isin(fp.values, self.known)
+        self.skipped += int((~fresh).sum())
+        return df[fresh]
+
+    @property
+    def rows(self):
+        return sum(len(fp) for fp in self.current)
+
+    def values(self):
+        return np.unique(np.concatenate(self.current)) if self.current else np.empty(0, dtype='int64')
+
+    def digest(self):
+        # Blatt-Hash: Reihenfolge und Inhalt aller Zeilen
+        h = hashlib.sha256()
+        for fp in self.current: h.update(fp.tobytes())
+        return h.hexdigest()
+
+def skipped_note(fingerprints):
+    return f", {fingerprints.skipped} unverändert übersprungen" if fingerprints is not None and fingerprints.skipped else ""
+
+# --- STAGE: GERÜSTE ---
+SCAFFOLD_UPSERT = """
+    INSERT INTO scaffolds (project_id, number, description, volume_m3, area_m2, weight_to, material_cost, acc)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(project_id, number) DO UPDATE SET
+        description=excluded.description, volume_m3=excluded.volume_m3, area_m2=excluded.area_m2,
+        weight_to=excluded.weight_to, material_cost=excluded.material_cost, acc=excluded.acc
+"""
+
+SCAFFOLD_COLUMNS = ['number', 'description', 'volume_m3', 'area_m2', 'weight_to', 'material_cost', 'acc']
+
+def normalize_scaffolds(df_scaf):
+    df_scaf.columns = df_scaf.columns.str.strip()
+    return pd.DataFrame({
+        'number': clean_scaffold_number_col(pick_col(df_scaf, ['Gerüstnummer'])),
+        'description': text_col(pick_col(df_scaf, ['Beschreibung'])),
+        'volume_m3': safe_float_col(pick_col(df_scaf, ['m3', 'm³', 'Volumen'])),
+        'area_m2': safe_float_col(pick_col(df_scaf, ['m2', 'm²', 'Fläche'])),
+        'weight_to': safe_float_col(pick_col(df_scaf, ['to'])),
+        'material_cost': safe_float_col(pick_col(df_scaf, ['Materialwert'])),
+        'acc': text_col(pick_col(df_scaf, ['ACC'])),
+    }, index=df_scaf.index)
+
+def as_chunks(data):
+    # Stages akzeptieren einen DataFrame oder einen Generator von DataFrame-Chunks
+    return [data] if isinstance(data, pd.DataFrame) else data
+
+def valid_scaffold_numbers(scaf):
+    return (scaf['number'] != "") & (scaf['number'] != "nan")
+
+def repeated_scaffolds(scaf):
+    # Gerüstnummer kommt weiter unten im Blatt noch einmal vor -> die spätere Zeile gilt
+    valid = valid_scaffold_numbers(scaf)
+    return valid & scaf['number'].where(valid).duplicated(keep='last')
+
+# prepare_* laufen nur in pandas (außerhalb der Schreib-Transaktion), write_* schreiben
+# das Ergebnis in einem Rutsch. Das Gerüst-Blatt wird komplett normalisiert (klein):
+# Duplikate werden vor dem Fingerprint-Filter entfernt, sonst könnte eine geänderte
+# frühere Zeile eine unveränderte spätere überschreiben ("letzte Zeile gewinnt").
+def prepare_scaffolds(chunks, fingerprints=None):
+    # -> (ganzes Blatt, zu schreibende Zeilen)
+    frames = [normalize_scaffolds(df_scaf) for df_scaf in as_chunks(chunks)]
+    scaf = pd.concat(frames) if frames else pd.DataFrame(columns=SCAFFOLD_COLUMNS)
+    rows, columns = scaffold_fingerprint_rows(scaf)
+    if fingerprints is not None: rows = fingerprints.filter(rows, columns)
+    return scaf, rows
+
+def write_scaffolds(conn, prepared, project_id, logs, fingerprints=None):
+    # Vorher/Nachher-Vergleich über die Schlüssel statt INSERT-Versuch + IntegrityError
+    scaf, scaf_rows = prepared
+    existing = {r[0] for r in conn.execute("SELECT number FROM scaffolds WHERE project_id = ?", (project_id,))}
+    repeated = repeated_scaffolds(scaf)
+    status = pd.Series("Übersprungen (Duplikat, spätere Zeile gilt)", index=scaf.index)
+    valid = valid_scaffold_numbers(scaf_rows)
+    is_update = scaf_rows['number'].isin(existing)
+    status[scaf_rows.index[~valid]] = "Ignoriert (Keine Nummer)"
+    status[scaf_rows.index[valid & is_update]] = "OK (UPDATED)"
+    status[scaf_rows.index[valid & ~is_update]] = "OK (NEU)"
+    status = status[status.index.isin(scaf_rows.index) | repeated.to_numpy()]
+
+    rows = scaf_rows[valid]
+    conn.executemany(SCAFFOLD_UPSERT, zip(
+        [project_id] * len(rows), rows['number'], rows['description'], rows['volume_m3'],
+        rows['area_m2'], rows['weight_to'], rows['material_cost'], rows['acc']))
+    count_scaf = len(rows)
+
+    row_no = pd.Series(status.index, index=status.index) + 2
+    logs.extend(("Z." + row_no.astype(str) + " [" + scaf.loc[status.index, 'number'] + "]: " + status).tolist())
+    logs.append(f"--> {count_scaf} Gerüste verarbeitet{skipped_note(fingerprints)}.")
+    return count_scaf
+
+# --- STAGE: STUNDEN ---
+# Duplikat-Prüfung mengenbasiert: Duplikate innerhalb der Datei werden in pandas
+# entfernt, Duplikate gegen die DB per NOT EXISTS über idx_work_entries_dedup
+# (Index auf dem normalisierten Tupel) -> eine Abfrage statt SELECT pro Zeile.
+HOURS_KEY = ['user_name', 'scaffold_number', 'work_date', 'hours', 'comment', 'version']
+
+def parse_hours_col(col):
+    if pd.api.types.is_numeric_dtype(col): return safe_float_col(col)
+    if pd.api.types.is_datetime64_any_dtype(col): return (col.dt.hour + col.dt.minute / 60.0).fillna(0.0)
+    is_clock = col.map(lambda v: isinstance(v, (dt_time, datetime)))
+    out = safe_float_col(col.where(~is_clock))
+    out[is_clock] = [v.hour + v.minute / 60.0 for v in col[is_clock]]
+    return out
+
+def parse_date_col(col):
+    parsed = pd.to_datetime(col, format='mixed')
+    return parsed.dt.strftime('%Y-%m-%d').fillna(date.today().isoformat())
+
+def normalize_hours(df_hours):
+    df_hours.columns = df_hours.columns.str.strip()
+    # Leerer Name (oder keine Spalte) -> 'Importiert', statt eines Mitarbeiters "None"
+    names = text_col(pick_col(df_hours, ['Name'])).str.strip()
+    names = names.where(names != "", "Importiert")
+    return pd.DataFrame({
+        'user_name': names,
+        'scaffold_number': clean_scaffold_number_col(pick_col(df_hours, ['Gerüstnummer'])),
+        'work_date': parse_date_col(pick_col(df_hours, ['Datum'])),
+        'hours': parse_hours_col(pick_col(df_hours, ['Stunden'])),
+        'comment': text_col(pick_col(df_hours, ['Anmerkungen'])),
+        'version': text_col(pick_col(df_hours, ['Versionsnummer'])),
+    }, index=df_hours.index)
+
+def _create_hours_staging(conn):
+    # Staging-Tabelle mit UNIQUE über das Tupel -> ein mengenbasierter INSERT ... NOT EXISTS
+    conn.execute("""CREATE TEMP TABLE IF NOT EXISTS import_hours (
+        seq INTEGER PRIMARY KEY, user_name TEXT, scaffold_number TEXT, work_date TEXT, hours REAL, comment TEXT, version TEXT,
+        UNIQUE (user_name, scaffold_number, work_date, hours, comment, version))""")
+    conn.execute("DELETE FROM import_hours")
+
+def _stage_hours(conn, hours):
+    unique_rows = hours[~hours.duplicated(HOURS_KEY)]
+    conn.executemany("INSERT OR IGNORE INTO import_hours (user_name, scaffold_number, work_date, hours, comment, version) VALUES (?, ?, ?, ?, ?, ?)",
+                     unique_rows[HOURS_KEY].itertuples(index=False, name=None))
+
+def _insert_staged_hours(conn, project_id):
+    # Fehlende Stammdaten anlegen (wie der INSTEAD-OF-Trigger auf work_logs)
+    conn.execute("INSERT OR IGNORE INTO workers (name) SELECT DISTINCT user_name FROM import_hours")
+    conn.execute("INSERT OR IGNORE INTO scaffolds (project_id, number) SELECT DISTINCT ?, scaffold_number FROM import_hours", (project_id,))
+    cur = conn.execute("""
+        INSERT INTO work_entries (project_id, scaffold_id, worker_id, work_date, hours, comment, version)
+        SELECT ?, s.id, k.id, t.work_date, t.hours, t.comment, t.version
+        FROM import_hours t
+        JOIN workers k ON k.name = t.user_name
+        JOIN scaffolds s ON s.project_id = ? AND s.number = t.scaffold_number
+        WHERE NOT EXISTS (
+            SELECT 1 FROM work_entries e
+            WHERE e.project_id = ? AND e.work_date = t.work_date AND e.worker_id = k.id AND e.scaffold_id = s.id
+              AND e.hours = t.hours AND e.comment = t.comment AND e.version = t.version)
+        ORDER BY t.seq
+    """, (project_id, project_id, project_id))
+    conn.execute("DELETE FROM import_hours")
+    return cur.rowcount
+
+def invalid_hours_col(col):
+    # Gesetzt, aber weder Zahl noch Uhrzeit (parse_hours_col würde 0.0 daraus machen)
+    if pd.api.types.is_numeric_dtype(col) or pd.api.types.is_datetime64_any_dtype(col): return pd.Series(False, index=col.index)
+    is_clock = col.map(lambda v: isinstance(v, (dt_time, datetime)))
+    txt = col.where(~is_clock).astype('string').str.replace(',', '.', regex=False).str.replace(' ', '', regex=False).str.strip()
+    return (pd.to_numeric(txt, errors='coerce').isna() & txt.fillna('').ne('')).astype(bool)
+
+def invalid_date_col(col):
+    return (col.notna() & pd.to_datetime(col, format='mixed', errors='coerce').isna()).astype(bool)
+
+def checked_hours(df_hours):
+    # -> (normalisierte Zeilen, Grund je Zeile; "" = gültig). Ungültig: keine Gerüstnummer,
+    # Stunden oder Datum nicht lesbar. Für die Anzeige bleibt ein unlesbares Datum als
+    # Text stehen, unlesbare Stunden werden NaN.
+    df_hours.columns = df_hours.columns.str.strip()
+    raw_dates, raw_hours = pick_col(df_hours, ['Datum']), pick_col(df_hours, ['Stunden'])
+    bad_date, bad_hours = invalid_date_col(raw_dates), invalid_hours_col(raw_hours)
+    # Unlesbares Datum vor dem Normalisieren leeren (sonst Fehler)
+    hours = normalize_hours(df_hours.assign(Datum=raw_dates.where(~bad_date)) if 'Datum' in df_hours.columns else df_hours)
+    hours.loc[bad_date, 'work_date'] = raw_dates[bad_date].astype(str)
+    hours.loc[bad_hours, 'hours'] = np.nan
+
+    note = pd.Series("", index=hours.index, dtype=object)
+    note[bad_date] = "Datum nicht lesbar"
+    note[bad_hours] = "Stunden nicht lesbar"
+    note[hours['scaffold_number'] == ""] = "Keine Gerüstnummer"
+    return hours, note
+
+# Zeilen (und Spalten), die in den Import-Stand eingehen – run_import und die Vorschau
+# nutzen dieselben Funktionen, damit die Fingerprints übereinstimmen
+def scaffold_fingerprint_rows(scaf):
+    return scaf[~repeated_scaffolds(scaf)], SCAFFOLD_COLUMNS
+
+def hours_fingerprint_rows(hours, note):
+    return hours[note == ""], HOURS_KEY
+
+def prepare_hours(chunks, fingerprints=None):
+    # -> (zu schreibende Zeilen ohne Duplikate innerhalb der Datei, geprüfte Zeilen, ungültige Zeilen)
+    parts, count_rows, count_invalid = [], 0, 0
+    for df_hours in as_chunks(chunks):
+        hours, note = checked_hours(df_hours)
+        count_invalid += int((note != "").sum())
+        hours, columns = hours_fingerprint_rows(hours, note)
+        if fingerprints is not None: hours = fingerprints.filter(hours, columns)
+        count_rows += len(hours)
+        parts.append(hours[~hours.duplicated(HOURS_KEY)])
+    rows = pd.concat(parts) if parts else pd.DataFrame(columns=HOURS_KEY)
+    return rows[~rows.duplicated(HOURS_KEY)], count_rows, count_invalid
+
+def write_hours(conn, prepared, project_id, logs, fingerprints=None):
+    # Duplikate gegen die DB per NOT EXISTS beim Einfügen aus der Staging-Tabelle
+    rows, count_rows, count_invalid = prepared
+    _create_hours_staging(conn)
+    _stage_hours(conn, rows)
+    count_hours = _insert_staged_hours(conn, project_id)
+    count_skip = count_rows - count_hours
+    invalid_note = f", {count_invalid} ungültig" if count_invalid else ""
+    logs.append(f"--> {count_hours} Stunden importiert ({count_skip} Duplikate{invalid_note}{skipped_note(fingerprints)}).")
+    return count_hours
+
+# --- VORSCHAU (Dry-Run) ---
+# Diff der komplett eingelesenen, spaltenweise normalisierten Blätter gegen den
+# DB-Stand per merge (keine Abfrage pro Zeile, kein Schreibzugriff). Status je Zeile:
+# - Gerüste: Schlüssel = Gerüstnummer -> neu | geändert (mit Feldliste) | unverändert;
+#   mehrfach in der Datei -> Duplikat (die letzte Zeile gewinnt, wie beim Upsert)
+# - Stunden: Schlüssel = ganzes Tupel (wie die Duplikat-Prüfung) -> neu | unverändert
+#   (schon in der DB) | Duplikat (mehrfach in der Datei); 'geändert' gibt es hier nicht
+# - ungültig: keine Gerüstnummer, Stunden oder Datum nicht lesbar (Grund in 'note')
+# apply_* schreiben danach nur neu/geändert, ohne die Datei erneut zu lesen.
+PREVIEW_STATUS = ['neu', 'geändert', 'unverändert', 'Duplikat', 'ungültig']
+SCAFFOLD_FIELDS = {'description': 'Beschreibung', 'volume_m3': 'm3', 'area_m2': 'm2', 'weight_to': 'to', 'material_cost': 'Materialwert', 'acc': 'ACC'}
+TEXT_FIELDS = ('description', 'acc')
+
+def _status_frame(df, status, note):
+    out = df.copy()
+    out.insert(0, 'row', out.index + 2)
+    out['status'] = status
+    out['note'] = note
+    return out
+
+def preview_scaffolds(scaf, existing):
+    # scaf: normalize_scaffolds(...), existing: Gerüste des Projekts (number + SCAFFOLD_FIELDS)
+    fields = list(SCAFFOLD_FIELDS)
+    valid = valid_scaffold_numbers(scaf)
+    old = scaf[['number']].merge(existing[['number'] + fields], on='number', how='left', indicator=True).set_axis(scaf.index)
+    known = old['_merge'] == 'both'
+    # NULL in der DB entspricht dem, was der Import für leere Zellen schreibt
+    before = pd.DataFrame({f: old[f].fillna("") if f in TEXT_FIELDS else old[f].astype(float).fillna(0.0) for f in fields}, index=scaf.index)
+    changed = scaf[fields].ne(before) & known.to_numpy()[:, None]
+    # bool × "Feld, " aufsummiert -> Liste der geänderten Felder je Zeile
+    note = changed.dot(pd.Series([f"{SCAFFOLD_FIELDS[f]}, " for f in fields], index=fields)).str.rstrip(", ")
+    duplicate = repeated_scaffolds(scaf)
+    status = np.select([~valid, duplicate, ~known, changed.any(axis=1)], ['ungültig', 'Duplikat', 'neu', 'geändert'], 'unverändert')
+    note = note.where(status == 'geändert', "").mask(~valid, "Keine Gerüstnummer")
+    return _status_frame(scaf, status, note)
+
+def preview_hours(df_hours, existing):
+    # df_hours: Rohblatt, existing: Buchungen des Projekts (HOURS_KEY)
+    hours, note = checked_hours(df_hours)
+    valid = note == ""
+    rows = hours.loc[valid, HOURS_KEY]
+    in_db = rows.merge(existing[HOURS_KEY].astype({'hours': float}).drop_duplicates(), on=HOURS_KEY, how='left', indicator=True)['_merge'].eq('both').to_numpy()
+    status = pd.Series('ungültig', index=hours.index, dtype=object)
+    status[valid] = np.select([in_db, rows.duplicated(HOURS_KEY).to_numpy()], ['unverändert', 'Duplikat'], 'neu')
+    return _status_frame(hours, status.to_numpy(), note)
+
+def preview_counts(frame):
+    return frame['status'].value_counts().reindex(PREVIEW_STATUS, fill_value=0)
+
+def apply_scaffolds(conn, preview, project_id):
+    rows = preview[preview['status'].isin(['neu', 'geändert'])]
+    conn.executemany(SCAFFOLD_UPSERT, zip(
+        [project_id] * len(rows), rows['number'], rows['description'], rows['volume_m3'],
+        rows['area_m2'], rows['weight_to'], rows['material_cost'], rows['acc']))
+    return len(rows)
+
+def apply_hours(conn, preview, project_id):
+    # Duplikate gegen die DB werden beim Schreiben erneut geprüft (Stand kann sich
+    # seit der Vorschau geändert haben) -> Rückgabe = tatsächlich eingefügte Zeilen
+    _create_hours_staging(conn)
+    _stage_hours(conn, preview[preview['status'] == 'neu'])
+    return _insert_staged_hours(conn, project_id)
+
+# --- WORKBOOK READER ---
+# Öffnet die Datei genau einmal (openpyxl read_only) und streamt die Zeilen eines
+# Blatts als DataFrame-Chunks fester Größe -> die openpyxl-Zellen einer großen Datei
+# liegen nie komplett im Speicher, nur die normalisierten Zeilen.
+CHUNK_SIZE = 5000
+
+class WorkbookReader:
+    def __init__(self, source, chunk_size=CHUNK_SIZE):
+        self.workbook = load_workbook(source, read_only=True, data_only=True)
+        self.chunk_size = chunk_size
+
+    @property
+    def sheet_names(self):
+        return self.workbook.sheetnames
+
+    def iter_chunks(self, sheet_name):
+        ws = self.workbook[sheet_name]
+        # Read-only vertraut dem <dimension>-Tag der Datei; ist der falsch (z.B. "A1"),
+        # fehlen Zeilen -> Ausdehnung beim Lesen selbst bestimmen (wie pd.read_excel)
+        ws.reset_dimensions()
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None: return
+        columns = [str(h) if h is not None else f"Unnamed: {i}" for i, h in enumerate(header)]
+        buffer, blanks, start = [], [], 0
+        for row in rows:
+            row = [None if v == '' else v for v in row]
+            # Leere Zeilen nur übernehmen, wenn danach noch Daten kommen (wie pd.read_excel)
+            if all(v is None for v in row):
+                blanks.append(row); continue
+            buffer.extend(blanks); blanks = []
+            buffer.append(row)
+            if len(buffer) >= self.chunk_size:
+                yield self._frame(buffer, columns, start)
+                start += len(buffer); buffer = []
+        if buffer: yield self._frame(buffer, columns, start)
+
+    def _frame(self, buffer, columns, start):
+        width = len(columns)
+        data = [r[:width] + [None] * (width - len(r)) for r in buffer]
+        # dtype=object: gleiche Typen in jedem Chunk, unabhängig vom Inhalt
+        return pd.DataFrame(data, columns=columns, index=pd.RangeIndex(start, start + len(data)), dtype=object)
+
+    def close(self):
+        self.workbook.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,322 @@
+import io
+import re
+import hashlib
+import logging
+import queue
+import threading
+import uuid
+from datetime import datetime
+
+import pandas as pd
+
+from db import get_pool, get_data, run_write
+from excel_import import (WorkbookReader, RowFingerprints, prepare_scaffolds, write_scaffolds, prepare_hours, write_hours, normalize_scaffolds,
+                          scaffold_fingerprint_rows, hours_fingerprint_rows, preview_scaffolds, preview_hours, preview_counts, apply_scaffolds, apply_hours)
+
+# --- IMPORT ENGINE ---
+# Zwei Schritte: prepare_import liest und normalisiert die Datei (nur lesender DB-Zugriff:
+# Projekt, Import-Stand), write_import schreibt das Ergebnis in einer Transaktion
+# (Projekt anlegen, 'Gerüste', 'Stundenübersicht', Import-Stand). So blockiert das
+# Parsen nicht die Schreib-Warteschlange.
+# progress(stage, rows) meldet Phase und verarbeitete Zeilen (Chunk-genau).
+def project_prefix(filename):
+    match = re.match(r'^([\d-]+)', filename)
+    if not match: raise ValueError(f"Kein Projekt-Präfix im Dateinamen: {filename} (z.B. 02-016_Projekt.xlsx)")
+    return match.group(1)
+
+def find_project(conn, prefix):
+    return conn.execute("SELECT id, name FROM projects WHERE name LIKE ? ORDER BY id LIMIT 1", (f"{prefix}%",)).fetchone()
+
+def detect_project(conn, filename, logs):
+    proj_prefix = project_prefix(filename)
+    res = find_project(conn, proj_prefix)
+    if res:
+        target_pid, target_pname = res
+        logs.append(f"✅ Projekt gefunden: {target_pname} (ID: {target_pid})")
+    else:
+        target_pid = conn.execute("INSERT INTO projects (name) VALUES (?)", (proj_prefix,)).lastrowid
+        target_pname = proj_prefix
+        logs.append(f"🆕 Neues Projekt erstellt: {target_pname} (ID: {target_pid})")
+    return target_pid
+
+def _counted(chunks, progress, stage):
+    rows = 0
+    for chunk in chunks:
+        yield chunk
+        rows += len(chunk)
+        progress(stage, rows)
+
+# --- INKREMENTELLER IMPORT ---
+# Stand des letzten Imports je Projekt-Präfix (import_files / import_fingerprints):
+# gleiche Datei (SHA-256) -> nichts zu tun; sonst werden pro Blatt nur Zeilen mit
+# neuem Fingerprint verarbeitet. incremental=False prüft alle Zeilen wie früher
+# (z.B. wenn in der App gelöschte Buchungen aus der Datei wiederhergestellt werden sollen).
+FILE_SHEET = ''
+
+def load_import_state(conn, prefix, project_id):
+    rows = conn.execute("SELECT sheet, hash, rows, imported_at FROM import_files WHERE prefix = ? AND project_id = ?", (prefix, project_id))
+    return {sheet: {'hash': h, 'rows': n, 'imported_at': at} for sheet, h, n, at in rows}
+
+def load_fingerprints(conn, prefix, sheet):
+    return (r[0] for r in conn.execute("SELECT fingerprint FROM import_fingerprints WHERE prefix = ? AND sheet = ?", (prefix, sheet)))
+
+def save_import_state(conn, prefix, project_id, sheet, digest, rows, fingerprints=None):
+    conn.execute("""INSERT INTO import_files (prefix, sheet, project_id, hash, rows, imported_at) VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(prefix, sheet) DO UPDATE SET project_id = excluded.project_id, hash = excluded.hash,
+                        rows = excluded.rows, imported_at = excluded.imported_at""",
+                 (prefix, sheet, project_id, digest, rows, _now()))
+    if fingerprints is None: return
+    conn.execute("DELETE FROM import_fingerprints WHERE prefix = ? AND sheet = ?", (prefix, sheet))
+    conn.executemany("INSERT INTO import_fingerprints (prefix, sheet, fingerprint) VALUES (?, ?, ?)",
+                     ((prefix, sheet, int(fp)) for fp in fingerprints.values()))
+
+IMPORT_STAGES = [('Gerüste', 'scaffolds', prepare_scaffolds, write_scaffolds), ('Stundenübersicht', 'hours', prepare_hours, write_hours)]
+
+def prepare_import(conn, filename, payload, progress=None, incremental=True):
+    progress = progress or (lambda stage, rows=0: None)
+    progress('Projekt', 0)
+    prefix = project_prefix(filename)
+    project = find_project(conn, prefix)
+    project_id = project[0] if project else None
+    state = load_import_state(conn, prefix, project_id) if incremental and project else {}
+    prepared = {'filename': filename, 'prefix': prefix, 'project_id': project_id, 'state': state,
+                'file_hash': hashlib.sha256(payload).hexdigest(), 'sheets': []}
+    if state.get(FILE_SHEET, {}).get('hash') == prepared['file_hash']: return prepared
+
+    # Datei einmal öffnen, beide Blätter als Chunks streamen
+    with WorkbookReader(io.BytesIO(payload)) as book:
+        for sheet, _, prepare, _ in IMPORT_STAGES:
+            if sheet not in book.sheet_names: continue
+            progress(sheet, 0)
+            fingerprints = RowFingerprints(load_fingerprints(conn, prefix, sheet) if sheet in state else ())
+            prepared['sheets'].append((sheet, prepare(_counted(book.iter_chunks(sheet), progress, sheet), fingerprints), fingerprints))
+    return prepared
+
+def write_import(conn, prepared, logs, progress=None):
+    progress = progress or (lambda stage, rows=0: None)
+    result = {'scaffolds': 0, 'hours': 0, 'skipped': 0}
+    progress('Schreiben', 0)
+    target_pid = detect_project(conn, prepared['filename'], logs)
+    prefix, state = prepared['prefix'], prepared['state']
+    # Mit Import-Stand eingelesen, aber das Projekt ist inzwischen ein anderes -> Filter ungültig
+    if state and target_pid != prepared['project_id']: raise RuntimeError("Projekt wurde während des Einlesens geändert – bitte erneut importieren.")
+    if state.get(FILE_SHEET, {}).get('hash') == prepared['file_hash']:
+        result['skipped'] = state[FILE_SHEET]['rows']
+        logs.append(f"⏭️ Datei unverändert seit dem Import vom {state[FILE_SHEET]['imported_at']} – {result['skipped']} Zeilen unverändert übersprungen.")
+        return result
+
+    writers = {sheet: (key, write) for sheet, key, _, write in IMPORT_STAGES}
+    sheet_rows = 0
+    for sheet, data, fingerprints in prepared['sheets']:
+        key, write = writers[sheet]
+        logs.append(("\n" if key == 'hours' else "") + f"--- Tab '{sheet}' ---")
+        result[key] = write(conn, data, target_pid, logs, fingerprints)
+        sheet_hash = fingerprints.digest()
+        if state.get(sheet, {}).get('hash') == sheet_hash: logs.append(f"⏭️ Blatt '{sheet}' unverändert.")
+        save_import_state(conn, prefix, target_pid, sheet, sheet_hash, fingerprints.rows, fingerprints)
+        result['skipped'] += fingerprints.skipped
+        sheet_rows += fingerprints.rows
+
+    save_import_state(conn, prefix, target_pid, FILE_SHEET, prepared['file_hash'], sheet_rows)
+    if result['skipped']: logs.append(f"\n⏭️ {result['skipped']} Zeilen unverändert seit dem letzten Import übersprungen.")
+    return result
+
+def run_import(conn, filename, source, logs, progress=None, incremental=True):
+    # Beide Schritte auf derselben Verbindung (Skripte, Benchmark)
+    return write_import(conn, prepare_import(conn, filename, source.read(), progress, incremental), logs, progress)
+
+# --- VORSCHAU (Dry-Run) + ÜBERNAHME ---
+# preview_import liest die Datei einmal komplett, normalisiert beide Blätter und
+# vergleicht sie mit dem DB-Stand (excel_import.preview_*) – nur lesend, auch ein
+# neues Projekt wird noch nicht angelegt. apply_preview schreibt danach den Diff
+# (neu/geändert) ohne erneutes Parsen und setzt den Stand für den inkrementellen
+# Import (Datei-Hash, Fingerprints) wie run_import.
+PREVIEW_SHEETS = ['Gerüste', 'Stundenübersicht']
+
+EXISTING_SCAFFOLDS_SQL = "SELECT number, description, volume_m3, area_m2, weight_to, material_cost, acc FROM scaffolds WHERE project_id = ?"
+EXISTING_HOURS_SQL = """
+    SELECT DISTINCT k.name AS user_name, s.number AS scaffold_number, e.work_date, e.hours, e.comment, e.version
+    FROM work_entries e JOIN workers k ON k.id = e.worker_id JOIN scaffolds s ON s.id = e.scaffold_id
+    WHERE e.project_id = ?"""
+
+def _read_sheet(book, sheet):
+    chunks = list(book.iter_chunks(sheet))
+    return pd.concat(chunks) if chunks else pd.DataFrame()
+
+def preview_import(filename, payload):
+    prefix = project_prefix(filename)
+    project = get_data("SELECT id, name FROM projects WHERE name LIKE ? ORDER BY id LIMIT 1", (f"{prefix}%",))
+    project_id = int(project['id'].iloc[0]) if len(project) else None
+    preview = {'filename': filename, 'prefix': prefix, 'project_id': project_id,
+               'project_name': project['name'].iloc[0] if len(project) else prefix,
+               'file_hash': hashlib.sha256(payload).hexdigest(), 'sheets': {}, 'fingerprints': {}, 'created_at': _now()}
+
+    with WorkbookReader(io.BytesIO(payload)) as book:
+        sheets = {sheet: _read_sheet(book, sheet) for sheet in PREVIEW_SHEETS if sheet in book.sheet_names}
+    # Fingerprints über dieselbe Zeilenmenge wie run_import (excel_import.*_fingerprint_rows)
+    if 'Gerüste' in sheets:
+        scaf = normalize_scaffolds(sheets['Gerüste'])
+        existing = get_data(EXISTING_SCAFFOLDS_SQL, (project_id or 0,), cache=False)
+        preview['fingerprints']['Gerüste'] = fingerprints = RowFingerprints()
+        fingerprints.filter(*scaffold_fingerprint_rows(scaf))
+        preview['sheets']['Gerüste'] = preview_scaffolds(scaf, existing)
+    if 'Stundenübersicht' in sheets:
+        existing = get_data(EXISTING_HOURS_SQL, (project_id or 0,), cache=False)
+        hours = preview_hours(sheets['Stundenübersicht'], existing)
+        preview['fingerprints']['Stundenübersicht'] = fingerprints = RowFingerprints()
+        fingerprints.filter(*hours_fingerprint_rows(hours, hours['note']))
+        preview['sheets']['Stundenübersicht'] = hours
+        workers = set(get_data("SELECT name FROM workers")['name'])
+        preview['new_workers'] = sorted(set(hours.loc[hours['status'] == 'neu', 'user_name']) - workers)
+    return preview
+
+def apply_preview(conn, preview, logs, progress=None):
+    progress = progress or (lambda stage, rows=0: None)
+    result = {'scaffolds': 0, 'hours': 0, 'skipped': 0}
+    progress('Projekt', 0)
+    target_pid = detect_project(conn, preview['filename'], logs)
+    logs.append(f"🔍 Übernahme der Vorschau vom {preview['created_at']} (Datei wird nicht erneut gelesen)")
+
+    sheets = preview['sheets']
+    if 'Gerüste' in sheets:
+        progress('Gerüste', 0)
+        counts = preview_counts(sheets['Gerüste'])
+        result['scaffolds'] = apply_scaffolds(conn, sheets['Gerüste'], target_pid)
+        logs.append(f"--- Tab 'Gerüste' ---\n--> {counts['neu']} neu, {counts['geändert']} geändert, {counts['unverändert']} unverändert, "
+                    f"{counts['Duplikat']} Duplikate, {counts['ungültig']} ungültig.")
+        result['skipped'] += int(counts['unverändert'])
+        progress('Gerüste', len(sheets['Gerüste']))
+    if 'Stundenübersicht' in sheets:
+        progress('Stundenübersicht', 0)
+        counts = preview_counts(sheets['Stundenübersicht'])
+        result['hours'] = apply_hours(conn, sheets['Stundenübersicht'], target_pid)
+        late = int(counts['neu']) - result['hours']
+        logs.append(f"\n--- Tab 'Stundenübersicht' ---\n--> {result['hours']} Stunden importiert, {counts['unverändert']} schon vorhanden, "
+                    f"{counts['Duplikat']} Duplikate, {counts['ungültig']} ungültig."
+                    + (f" {late} seit der Vorschau von anderer Seite gebucht." if late else ""))
+        result['skipped'] += int(counts['unverändert'])
+        progress('Stundenübersicht', len(sheets['Stundenübersicht']))
+
+    for sheet, fingerprints in preview['fingerprints'].items():
+        save_import_state(conn, preview['prefix'], target_pid, sheet, fingerprints.digest(), fingerprints.rows, fingerprints)
+    save_import_state(conn, preview['prefix'], target_pid, FILE_SHEET, preview['file_hash'],
+                      sum(fp.rows for fp in preview['fingerprints'].values()))
+    return result
+
+# --- JOB RUNNER ---
+# Ein Worker-Thread pro Prozess arbeitet die Uploads nacheinander ab -> Importe
+# konkurrieren nicht um den Schreib-Lock, und die Arbeit läuft weiter, auch wenn
+# der Browser die Verbindung verliert.
+# Ein Job = (prepare, write): prepare liest/normalisiert mit einer Lese-Verbindung
+# außerhalb der Schreib-Warteschlange, nur write läuft dort (group=False, eine
+# Transaktion mit dem Abschluss-Status). Buchungen warten also nur auf den Bulk-INSERT.
+# Ein Job ist entweder ein Upload (prepare_import/write_import) oder die Übernahme
+# einer Vorschau (apply_preview, nichts mehr einzulesen).
+# Nur der Worker schreibt in import_jobs. Wartende Jobs und der Live-Fortschritt
+# liegen im Speicher; ebenso Jobs, deren Fehler nicht mehr in import_jobs
+# gespeichert werden konnte (sonst verschwänden sie ohne Meldung aus der Liste).
+JOB_STATUS_LABELS = {'queued': '⏳ Wartet', 'running': '🔄 Läuft', 'done': '✅ Fertig', 'failed': '❌ Fehler'}
+
+log = logging.getLogger(__name__)
+
+def _now():
+    return datetime.now().isoformat(sep=' ', timespec='seconds')
+
+class ImportJobRunner:
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._active = {}              # job_id -> Job (wartend, laufend oder ohne gespeicherten Fehler)
+        self._thread = threading.Thread(target=self._work, name="import-jobs", daemon=True)
+        self._thread.start()
+
+    def submit(self, filename, payload, incremental=True):
+        return self._submit(filename, lambda conn, progress: prepare_import(conn, filename, payload, progress, incremental), write_import)
+
+    def submit_preview(self, preview):
+        return self._submit(preview['filename'], lambda conn, progress: preview, apply_preview)
+
+    def _submit(self, filename, prepare, write):
+        job_id = uuid.uuid4().hex
+        job = {'id': job_id, 'filename': filename, 'status': 'queued', 'stage': 'Warteschlange',
+               'rows': 0, 'created_at': _now(), 'started_at': None, 'error': None}
+        with self._lock: self._active[job_id] = job
+        self._queue.put((job_id, prepare, write))
+        return job_id
+
+    def busy(self):
+        with self._lock: return any(job['status'] in ('queued', 'running') for job in self._active.values())
+
+    def active_jobs(self):
+        with self._lock: return [dict(job) for job in self._active.values()]
+
+    def _update(self, job_id, **fields):
+        with self._lock: self._active[job_id].update(fields)
+
+    def _work(self):
+        self._recover()
+        while True:
+            job_id, prepare, write = self._queue.get()
+            try:
+                self._run(job_id, prepare, write)
+                with self._lock: self._active.pop(job_id, None)
+            except Exception as e:
+                # Status nicht speicherbar (z.B. Job-Tabelle während Reset weg) -> im Speicher behalten
+                log.exception("Import-Auftrag %s fehlgeschlagen", job_id)
+                self._update(job_id, status='failed', stage='Fehler', error=f"{type(e).__name__}: {e}")
+
+    def _recover(self):
+        # Jobs, die beim letzten Prozessende noch liefen, wurden zurückgerollt
+        try: run_write(lambda conn: conn.execute("UPDATE import_jobs SET status = 'failed', error = 'Abgebrochen (Server-Neustart)', finished_at = ? WHERE status = 'running'", (_now(),)))
+        except Exception: log.exception("Abgebrochene Import-Aufträge konnten nicht markiert werden")
+
+    def _run(self, job_id, prepare, write):
+        job = self._active[job_id]
+        started = _now()
+        run_write(lambda conn: conn.execute("INSERT INTO import_jobs (id, filename, status, stage, created_at, started_at) VALUES (?, ?, 'running', 'Projekt', ?, ?)",
+                                            (job_id, job['filename'], job['created_at'], started)))
+        self._update(job_id, status='running', stage='Projekt', started_at=started)
+
+        logs = []
+        progress = lambda stage, rows=0: self._update(job_id, stage=stage, rows=rows)
+        def mutation(conn):
+            # Schreiben und Abschluss-Status in einer Transaktion (bei Wiederholung neu)
+            logs.clear()
+            result = write(conn, prepared, logs, progress)
+            conn.execute("""UPDATE import_jobs SET status = 'done', stage = 'Fertig', rows_scaffolds = ?, rows_hours = ?,
+                            rows_skipped = ?, logs = ?, finished_at = ? WHERE id = ?""",
+                         (result['scaffolds'], result['hours'], result['skipped'], "\n".join(logs), _now(), job_id))
+        try:
+            with get_pool().read() as conn: prepared = prepare(conn, progress)
+            run_write(mutation, group=False)
+        except Exception as e:
+            run_write(lambda conn: conn.execute("UPDATE import_jobs SET status = 'failed', logs = ?, error = ?, finished_at = ? WHERE id = ?",
+                                                ("\n".join(logs), str(e), _now(), job_id)))
+
+_runner = None
+_runner_lock = threading.Lock()
+
+def get_runner():
+    global _runner
+    with _runner_lock:
+        if _runner is None: _runner = ImportJobRunner()
+        return _runner
+
+# --- STATUS (für die UI) ---
+def load_jobs(limit=10):
+    # Gespeicherte Jobs + Live-Stand der wartenden/laufenden Jobs aus dem Speicher
+    df = get_data("""SELECT id, filename, status, stage, rows_scaffolds, rows_hours, rows_skipped, error, created_at, started_at, finished_at
+                     FROM import_jobs ORDER BY created_at DESC, rowid DESC LIMIT ?""", (limit,))
+    active = pd.DataFrame(get_runner().active_jobs(), columns=['id', 'filename', 'status', 'stage', 'rows', 'error', 'created_at', 'started_at'])
+    df = pd.concat([active.drop(columns='rows'), df[~df['id'].isin(active['id'])]], ignore_index=True)
+    live_rows = dict(zip(active['id'], active['rows']))
+    df['live_rows'] = df['id'].map(live_rows)
+    return df.head(max(limit, len(active)))
+
+def load_job_logs(job_id):
+    # Fehler, der nicht mehr gespeichert werden konnte, steht nur im Speicher des Workers
+    job = next((j for j in get_runner().active_jobs() if j['id'] == job_id and j['status'] == 'failed'), None)
+    if job: return {'status': 'failed', 'logs': None, 'error': job['error']}
+    df = get_data("SELECT status, logs, error FROM import_jobs WHERE id = ?", (job_id,))
+    if df.empty: return None
+    return df.iloc[0].to_dict()
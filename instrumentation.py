@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+# --- INSTRUMENTIERUNG ---
+# Zeitmessung der heißen Pfade (SQL in get_data/run_query, pandas, to_excel, Plotly).
+# - Pro Rerun: start_rerun() ... finish_rerun() sammelt alle Messungen des
+#   Skript-Threads (Anzahl Queries, Zeilen, Zeit je Bereich).
+# - Prozessweit: Summen je (Bereich, Bezeichnung) und ein Slow-Query-Log mit
+#   EXPLAIN QUERY PLAN für Queries über dem Schwellwert.
+# Messungen außerhalb eines Reruns (Hintergrund-Import, Download-Callbacks,
+# Fragment-Läufe) landen nur in den prozessweiten Summen.
+PROFILE_CONFIG = {
+    'slow_query_ms': float(os.environ.get('PROMAINTAIN_SLOW_QUERY_MS', 200)),
+    'slow_log_size': 100,
+    'rerun_events': 500,           # max. Einzelmessungen pro Rerun
+}
+
+_local = threading.local()
+_lock = threading.Lock()
+_totals = {}                       # (kind, label) -> {'count', 'total_s', 'max_s', 'rows'}
+_slow_log = deque(maxlen=PROFILE_CONFIG['slow_log_size'])
+
+def _label(sql):
+    return " ".join(str(sql).split())[:120]
+
+def start_rerun():
+    _local.profile = {'started_at': datetime.now().isoformat(timespec='seconds'), 'start': time.perf_counter(), 'events': []}
+
+def finish_rerun():
+    profile = getattr(_local, 'profile', None)
+    _local.profile = None
+    if profile is None: return None
+    profile['duration_s'] = time.perf_counter() - profile.pop('start')
+    return profile
+
+def record(kind, label, seconds, rows=None, cached=False):
+    with _lock:
+        t = _totals.setdefault((kind, label), {'count': 0, 'total_s': 0.0, 'max_s': 0.0, 'rows': 0})
+        t['count'] += 1
+        t['total_s'] += seconds
+        t['max_s'] = max(t['max_s'], seconds)
+        t['rows'] += rows or 0
+    profile = getattr(_local, 'profile', None)
+    if profile is not None and len(profile['events']) < PROFILE_CONFIG['rerun_events']:
+        profile['events'].append({'kind': kind, 'label': label, 'seconds': seconds, 'rows': rows, 'cached': cached})
+
+@contextmanager
+def timer(kind, label):
+    start = time.perf_counter()
+    try: yield
+    finally: record(kind, label, time.perf_counter() - start)
+
+def record_query(kind, sql, params, seconds, rows=None, cached=False, conn=None):
+    record(kind, _label(sql), seconds, rows, cached)
+    if cached or seconds * 1000 < PROFILE_CONFIG['slow_query_ms']: return
+    plan = explain(conn, sql, params) if conn is not None else None
+    with _lock:
+        _slow_log.append({'time': datetime.now().isoformat(timespec='seconds'), 'kind': kind, 'ms': round(seconds * 1000, 1),
+                          'rows': rows, 'sql': " ".join(str(sql).split()), 'params': [str(p) for p in params], 'plan': plan})
+
+def explain(conn, sql, params=()):
+    # EXPLAIN QUERY PLAN als eingerückter Text (wie in der sqlite3-Shell)
+    try: rows = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    except Exception as e: return f"(kein Plan: {e})"
+    depth, lines = {0: -1}, []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return "\n".join(lines)
+
+def set_slow_threshold(ms):
+    PROFILE_CONFIG['slow_query_ms'] = float(ms)
+
+def summarize(profile):
+    # Je Bereich: Anzahl, Zeit, Zeilen, Cache-Treffer
+    summary = {}
+    for e in (profile or {}).get('events', []):
+        s = summary.setdefault(e['kind'], {'count': 0, 'seconds': 0.0, 'rows': 0, 'cached': 0})
+        s['count'] += 1
+        s['seconds'] += e['seconds']
+        s['rows'] += e['rows'] or 0
+        s['cached'] += int(e['cached'])
+    return summary
+
+def path_totals():
+    with _lock: return [dict(kind=k, label=l, **v) for (k, l), v in _totals.items()]
+
+def slow_queries():
+    with _lock: return list(_slow_log)
+
+def reset():
+    with _lock:
+        _totals.clear()
+        _slow_log.clear()
+
+def export_json(profile=None):
+    return json.dumps({
+        'exported_at': datetime.now().isoformat(timespec='seconds'),
+        'config': PROFILE_CONFIG,
+        'last_rerun': profile,
+        'last_rerun_summary': summarize(profile),
+        'totals': path_totals(),
+        'slow_queries': slow_queries(),
+    }, indent=2, ensure_ascii=False, default=str)
@@ -0,0 +1,256 @@
+import re
+
+import pandas as pd
+
+from db import get_data
+
+# --- REPORT QUERIES (Admin-Dashboards) ---
+# Filter und Aggregation laufen komplett in SQLite -> Kosten hängen von der
+# Treffermenge ab, nicht von der Größe der Datenbank.
+
+MASTER_COLUMNS = ['Projekt', 'Gerüstnummer', 'm3', 'm2', 'to', 'Materialwert', 'Eur/to', 'Euro/m3', 'kg/m3', 'Planer', 'ACC', 'Beschreibung', 'Planungsstunden']
+
+def in_clause(column, values, params):
+    # Hängt die Werte an params an und liefert " AND column IN (?, ?, ...)"
+    if not values: return ""
+    params.extend(values)
+    return f" AND {column} IN ({','.join(['?'] * len(values))})"
+
+def build_master_query(projects=(), workers=(), scaffolds=()):
+    params = []
+    where = "WHERE 1=1"
+    where += in_clause("p.name", list(projects), params)
+    where += in_clause("k.name", list(workers), params)
+    where += in_clause("s.number", list(scaffolds), params)
+    # Stufe 1: Stunden je Gerüst und Planer; Planerliste als Fensterfunktion (ORDER BY im
+    #          Fenster legt die Reihenfolge fest, group_concat(... ORDER BY) erst ab SQLite 3.44)
+    # Stufe 2: je Gerüst summieren, Planerliste übernehmen, Kennzahlen berechnen
+    query = f'''
+        WITH per_worker AS (
+            SELECT s.id AS scaffold_id, SUM(e.hours) AS hours,
+                   group_concat(k.name, ', ') OVER (PARTITION BY s.id ORDER BY k.name
+                       ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING) AS planer
+            FROM scaffolds s
+            JOIN projects p ON s.project_id = p.id
+            LEFT JOIN work_entries e ON e.scaffold_id = s.id
+            LEFT JOIN workers k ON k.id = e.worker_id
+            {where}
+            GROUP BY s.id, k.name
+        )
+        SELECT
+            p.name AS Projekt,
+            s.number AS Gerüstnummer,
+            COALESCE(s.volume_m3, 0) AS m3,
+            COALESCE(s.area_m2, 0) AS m2,
+            COALESCE(s.weight_to, 0) AS "to",
+            COALESCE(s.material_cost, 0) AS Materialwert,
+            CASE WHEN s.weight_to > 0 THEN COALESCE(s.material_cost, 0) / s.weight_to ELSE 0 END AS "Eur/to",
+            CASE WHEN s.volume_m3 > 0 THEN COALESCE(s.material_cost, 0) / s.volume_m3 ELSE 0 END AS "Euro/m3",
+            CASE WHEN s.volume_m3 > 0 THEN COALESCE(s.weight_to, 0) * 1000 / s.volume_m3 ELSE 0 END AS "kg/m3",
+            COALESCE(MAX(pw.planer), '') AS Planer,
+            COALESCE(s.acc, '') AS ACC,
+            COALESCE(s.description, '') AS Beschreibung,
+            COALESCE(SUM(pw.hours), 0.0) AS Planungsstunden
+        FROM per_worker pw
+        JOIN scaffolds s ON s.id = pw.scaffold_id
+        JOIN projects p ON s.project_id = p.id
+        GROUP BY s.id
+        ORDER BY p.name, s.number
+    '''
+    return query, tuple(params)
+
+def load_master(projects=(), workers=(), scaffolds=()):
+    query, params = build_master_query(projects, workers, scaffolds)
+    return get_data(query, params, typed=True)
+
+# --- FILTER-KATALOGE ---
+# Auswahllisten für die Multiselects direkt aus den Stammtabellen bzw. per DISTINCT,
+# statt die Buchungen zu laden und in pandas zu deduplizieren. Planer kommen aus
+# rollup_project_worker (nur Paare mit Buchungen, Trigger-gepflegt).
+def catalog_projects():
+    return get_data("SELECT name FROM projects ORDER BY name")['name'].tolist()
+
+def catalog_workers(projects=()):
+    params = []
+    query = """SELECT DISTINCT k.name FROM rollup_project_worker r
+               JOIN workers k ON k.id = r.worker_id JOIN projects p ON p.id = r.project_id WHERE 1=1"""
+    query += in_clause("p.name", list(projects), params) + " ORDER BY k.name"
+    return get_data(query, tuple(params))['name'].tolist()
+
+def catalog_scaffolds(projects=()):
+    params = []
+    query = "SELECT DISTINCT s.number FROM scaffolds s JOIN projects p ON p.id = s.project_id WHERE 1=1"
+    query += in_clause("p.name", list(projects), params) + " ORDER BY s.number"
+    return get_data(query, tuple(params))['number'].tolist()
+
+# --- STUNDENÜBERSICHT ---
+DETAIL_EXPORT_COLUMNS = ['Datum', 'Name', 'Gerüstnummer', 'Stunden', 'Anmerkungen', 'Versionsnummer']
+
+DETAIL_PAGE_SIZES = [50, 100, 250, 500]
+
+def _details_where(projects, workers, scaffolds, date_from, date_to, params):
+    where = " WHERE 1=1"
+    where += in_clause("project_name", list(projects), params)
+    where += in_clause("user_name", list(workers), params)
+    where += in_clause("scaffold_number", list(scaffolds), params)
+    if date_from:
+        where += " AND work_date >= ?"; params.append(str(date_from))
+    if date_to:
+        where += " AND work_date <= ?"; params.append(str(date_to))
+    return where
+
+def build_details_query(projects=(), workers=(), scaffolds=(), date_from=None, date_to=None, before_id=None, limit=None):
+    # Keyset-Pagination: nächste Seite = Einträge mit id < letzter id der aktuellen Seite
+    params = []
+    query = "SELECT id, work_date as Datum, user_name as Name, scaffold_number as Gerüstnummer, hours as Stunden, comment as Anmerkungen, version as Versionsnummer, project_name as Projekt FROM work_logs"
+    query += _details_where(projects, workers, scaffolds, date_from, date_to, params)
+    if before_id is not None:
+        query += " AND id < ?"; params.append(int(before_id))
+    query += " ORDER BY id DESC"
+    if limit is not None:
+        query += " LIMIT ?"; params.append(int(limit))
+    return query, tuple(params)
+
+def load_details(projects=(), workers=(), scaffolds=(), date_from=None, date_to=None):
+    query, params = build_details_query(projects, workers, scaffolds, date_from, date_to)
+    return get_data(query, params, typed=True)
+
+def load_details_page(projects=(), workers=(), scaffolds=(), date_from=None, date_to=None, before_id=None, page_size=100):
+    # Eine Zeile mehr laden, um zu wissen, ob es eine weitere Seite gibt
+    query, params = build_details_query(projects, workers, scaffolds, date_from, date_to, before_id, page_size + 1)
+    page = get_data(query, params, typed=True)
+    return page.head(page_size), len(page) > page_size
+
+def load_details_summary(projects=(), workers=(), scaffolds=(), date_from=None, date_to=None):
+    params = []
+    query = "SELECT COUNT(*) AS entries, COALESCE(SUM(hours), 0) AS hours FROM work_logs"
+    query += _details_where(projects, workers, scaffolds, date_from, date_to, params)
+    return get_data(query, tuple(params)).iloc[0]
+
+# --- VOLLTEXTSUCHE (FTS5, db.py Migration 10) ---
+# Eingabe -> Präfix-Suche aller Wörter (UND-verknüpft); Zeichen der FTS-Syntax fallen weg.
+# Sortiert nach bm25-Relevanz. Gerankt werden höchstens die neuesten SEARCH_RANK_LIMIT
+# Treffer (FTS5 liefert die rowids absteigend ohne Sortierung) -> Laufzeit bleibt
+# auch bei Begriffen mit Hunderttausenden Treffern begrenzt.
+SEARCH_PAGE_SIZE = 25
+SEARCH_RANK_LIMIT = 1000
+SEARCH_COUNT_LIMIT = 10000         # Zählung darüber abbrechen -> "10000+"
+SEARCH_COLUMNS = ['id', 'Datum', 'Name', 'Projekt', 'Gerüstnummer', 'Stunden', 'Anmerkungen', 'Versionsnummer', 'Beschreibung']
+
+def fts_query(text):
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text or ""))
+
+def search_entries(text, page=0, page_size=SEARCH_PAGE_SIZE):
+    # -> (Treffer der Seite, Anzahl Treffer bis SEARCH_COUNT_LIMIT + 1)
+    match = fts_query(text)
+    if not match: return pd.DataFrame(columns=SEARCH_COLUMNS), 0
+    total = int(get_data("SELECT COUNT(*) FROM (SELECT 1 FROM search_index WHERE search_index MATCH ? LIMIT ?)",
+                         (match, SEARCH_COUNT_LIMIT + 1)).iloc[0, 0])
+    hits = get_data("""
+        SELECT e.id, e.work_date AS Datum, k.name AS Name, p.name AS Projekt, s.number AS Gerüstnummer, e.hours AS Stunden,
+               e.comment AS Anmerkungen, e.version AS Versionsnummer, s.description AS Beschreibung
+        FROM (SELECT rowid, rank FROM search_index WHERE search_index MATCH ? ORDER BY rowid DESC LIMIT ?) f
+        JOIN work_entries e ON e.id = f.rowid
+        JOIN workers k ON k.id = e.worker_id
+        JOIN projects p ON p.id = e.project_id
+        JOIN scaffolds s ON s.id = e.scaffold_id
+        ORDER BY f.rank, f.rowid DESC
+        LIMIT ? OFFSET ?""", (match, SEARCH_RANK_LIMIT, page_size, page * page_size))
+    return hits, total
+
+# --- KPI ---
+# Liest nur die Rollup-Tabellen (db.py, Migration 5) -> unabhängig von der Anzahl der Buchungen
+def load_project_totals(project_name):
+    return get_data('''
+        SELECT COALESCE(r.volume_m3, 0) AS volume_m3, COALESCE(r.material_cost, 0) AS material_cost, COALESCE(r.hours, 0) AS hours
+        FROM projects p LEFT JOIN rollup_project r ON r.project_id = p.id
+        WHERE p.name = ?
+    ''', (project_name,))
+
+def load_project_worker_hours(project_name):
+    return get_data('''
+        SELECT k.name AS user_name, r.hours
+        FROM rollup_project_worker r
+        JOIN workers k ON k.id = r.worker_id
+        WHERE r.project_id = (SELECT id FROM projects WHERE name = ?)
+        ORDER BY k.name
+    ''', (project_name,))
+
+def load_project_scaffold_hours(project_name):
+    return get_data('''
+        SELECT s.number AS scaffold_number, r.hours
+        FROM rollup_project_scaffold r
+        JOIN scaffolds s ON s.id = r.scaffold_id
+        WHERE r.project_id = (SELECT id FROM projects WHERE name = ?)
+        ORDER BY s.number
+    ''', (project_name,))
+
+# --- PORTFOLIO ---
+# Alle Projekte in einer Abfrage: Summen aus rollup_project, Gewicht aus scaffolds
+# (klein, eine Zeile je Gerüst). Ranking (ROW_NUMBER) und Top-N/"Sonstige" laufen in
+# SQL -> eine Abfrage, egal wie viele Projekte. Kennzahlen der "Sonstige"-Zeile werden
+# aus deren Summen berechnet, nicht gemittelt.
+PORTFOLIO_METRICS = {
+    'Planungsstunden': 'Planungsstunden', 'm³': 'm3', 'Materialwert': 'Materialwert',
+    'Euro/m³': '"Euro/m3"', 'kg/m³': '"kg/m3"', 'Stunden/m³': '"h/m3"',
+}
+
+def _ratios(vol, cost, weight, hours):
+    return (f'CASE WHEN {vol} > 0 THEN {cost} / {vol} ELSE 0 END AS "Euro/m3", '
+            f'CASE WHEN {vol} > 0 THEN {weight} * 1000 / {vol} ELSE 0 END AS "kg/m3", '
+            f'CASE WHEN {vol} > 0 THEN {hours} / {vol} ELSE 0 END AS "h/m3"')
+
+def load_portfolio(metric='Planungsstunden', top_n=15, ascending=False):
+    order = f"{PORTFOLIO_METRICS[metric]} {'ASC' if ascending else 'DESC'}"
+    return get_data(f'''
+        WITH base AS (
+            SELECT p.name AS Projekt, COALESCE(r.scaffold_count, 0) AS Gerüste, COALESCE(r.volume_m3, 0) AS m3,
+                   COALESCE(r.material_cost, 0) AS Materialwert, COALESCE(w.weight_to, 0) AS weight_to, COALESCE(r.hours, 0) AS Planungsstunden
+            FROM projects p
+            LEFT JOIN rollup_project r ON r.project_id = p.id
+            LEFT JOIN (SELECT project_id, SUM(weight_to) AS weight_to FROM scaffolds GROUP BY project_id) w ON w.project_id = p.id
+        ),
+        ranked AS (
+            SELECT *, ROW_NUMBER() OVER (ORDER BY {order}, Projekt) AS Rang
+            FROM (SELECT *, {_ratios('m3', 'Materialwert', 'weight_to', 'Planungsstunden')} FROM base)
+        ),
+        grouped AS (
+            SELECT MIN(Rang) AS Rang, CASE WHEN MIN(Rang) <= ? THEN MIN(Projekt) ELSE 'Sonstige' END AS Projekt, COUNT(*) AS Projekte,
+                   SUM(Gerüste) AS Gerüste, SUM(m3) AS m3, SUM(Materialwert) AS Materialwert, SUM(weight_to) AS weight_to,
+                   SUM(Planungsstunden) AS Planungsstunden
+            FROM ranked
+            GROUP BY CASE WHEN Rang <= ? THEN Rang ELSE ? + 1 END
+        )
+        SELECT Rang, Projekt, Projekte, Gerüste, m3, weight_to AS "to", Materialwert, Planungsstunden,
+               {_ratios('m3', 'Materialwert', 'weight_to', 'Planungsstunden')}
+        FROM grouped
+        ORDER BY Rang
+    ''', (int(top_n), int(top_n), int(top_n)))
+
+# --- ZEITREIHEN ---
+# Liest rollup_daily (db.py, Migration 8): Woche/Monat werden aus den Tageszeilen
+# summiert, Zeiträume laufen über den Primärschlüssel (project_id, work_date, ...).
+# Woche = Montag der Kalenderwoche, Monat = Monatserster.
+TIME_BUCKETS = {
+    'Tag': "d.work_date",
+    'Woche': "date(d.work_date, 'weekday 0', '-6 days')",
+    'Monat': "strftime('%Y-%m-01', d.work_date)",
+}
+TIME_SPLITS = {'Gesamt': "'Gesamt'", 'Gerüst': "s.number", 'Mitarbeiter': "k.name"}
+
+def load_project_date_range(project_name):
+    return get_data("""
+        SELECT MIN(work_date) AS first, MAX(work_date) AS last FROM rollup_daily
+        WHERE project_id = (SELECT id FROM projects WHERE name = ?) AND work_date != ''
+    """, (project_name,)).iloc[0]
+
+def load_hours_timeseries(project_name, date_from, date_to, bucket='Woche', split='Gerüst'):
+    return get_data(f"""
+        SELECT {TIME_BUCKETS[bucket]} AS Zeitraum, {TIME_SPLITS[split]} AS Gruppe, SUM(d.hours) AS Stunden, SUM(d.entries) AS Buchungen
+        FROM rollup_daily d
+        JOIN scaffolds s ON s.id = d.scaffold_id
+        JOIN workers k ON k.id = d.worker_id
+        WHERE d.project_id = (SELECT id FROM projects WHERE name = ?) AND d.work_date BETWEEN ? AND ?
+        GROUP BY Zeitraum, Gruppe
+        ORDER BY Zeitraum, Gruppe
+    """, (project_name, str(date_from), str(date_to)))
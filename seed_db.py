@@ -1,128 +1,112 @@
-import sqlite3
+import argparse
 import random
 from datetime import date, timedelta
 
-DB_FILE = 'construction_log.db'
+import db
 
-def seed_data():
-    print("🌱 Starte Datengenerierung (Mit Projektnummern)...")
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
+# --- GENERATOR ---
+# Synthetische Daten in beliebiger Größe: Projekte × Gerüste × Mitarbeiter × Tage.
+# Fester Seed -> gleiche Daten bei gleichen Parametern (reproduzierbare Benchmarks).
+# Ohne Parameter entsteht der kleine Demo-Datensatz wie bisher.
+DEMO_WORKERS = [
+    ("Andreas Schmidt", "Gerüstbauer"),
+    ("Thomas Müller", "Vorarbeiter"),
+    ("Michael Weber", "Bauleiter"),
+    ("Klaus Wagner", "Planer"),
+]
+DEMO_PROJECTS = ["02-016 Wohnpark Berlin-Mitte", "05-104 Einkaufszentrum West", "03-099 Logistikzentrum Nord"]
+POSITIONS = ["Gerüstbauer", "Vorarbeiter", "Bauleiter", "Planer"]
+DESCRIPTIONS = ["Nordfassade", "Südfassade", "Haupteingang", "Halle Innen", "Treppenturm", "Dachfang", "Innenhof"]
+HOURS = [2.0, 4.0, 5.5, 8.0]
+COMMENTS = ["", "Korrektur Statik", "Entwurf", "Detailplanung"]
+VERSIONS = ["v1", "v2", ""]
+BATCH_SIZE = 50000
+
+def project_names(n):
+    names = DEMO_PROJECTS[:n]
+    names += [f"{10 + i // 1000:02d}-{i % 1000:03d} Projekt {i + 1}" for i in range(len(names), n)]
+    return names
 
-    # 1. СОЗДАНИЕ ТАБЛИЦ
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS projects
-                 (id INTEGER PRIMARY KEY, name TEXT UNIQUE)''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS workers
-                 (id INTEGER PRIMARY KEY, name TEXT UNIQUE, position TEXT)''')
-    
-    # Таблица лесов
-    c.execute('''CREATE TABLE IF NOT EXISTS scaffolds
-                 (id INTEGER PRIMARY KEY, 
-                  project_id INTEGER,
-                  number TEXT, 
-                  description TEXT,
-                  acc TEXT,
-                  volume_m3 REAL,
-                  area_m2 REAL,
-                  weight_to REAL,
-                  material_cost REAL,
-                  FOREIGN KEY(project_id) REFERENCES projects(id),
-                  UNIQUE(project_id, number))''')
-                  
-    # Таблица часов
-    c.execute('''CREATE TABLE IF NOT EXISTS work_logs
-                 (id INTEGER PRIMARY KEY, 
-                  user_name TEXT, 
-                  project_name TEXT, 
-                  scaffold_number TEXT, 
-                  work_date DATE, 
-                  hours REAL,
-                  comment TEXT,
-                  version TEXT)''')
+def worker_rows(n):
+    rows = DEMO_WORKERS[:n]
+    rows += [(f"Mitarbeiter {i + 1:05d}", POSITIONS[i % len(POSITIONS)]) for i in range(len(rows), n)]
+    return rows
 
-    # 2. СОТРУДНИКИ
-    workers = [
-        ("Andreas Schmidt", "Gerüstbauer"),
-        ("Thomas Müller", "Vorarbeiter"),
-        ("Michael Weber", "Bauleiter"),
-        ("Klaus Wagner", "Planer")
-    ]
-    for name, pos in workers:
-        try: c.execute("INSERT INTO workers (name, position) VALUES (?, ?)", (name, pos))
-        except: pass 
+def scaffold_rows(rng, project_ids, per_project):
+    for pid in project_ids:
+        for k in range(per_project):
+            vol = rng.randint(50, 500)
+            weight = round(vol * rng.uniform(0.02, 0.03), 1)
+            yield (pid, f"G-{101 + k}", rng.choice(DESCRIPTIONS), rng.choice(["ja", "nein", ""]),
+                   vol, round(vol * rng.uniform(0.4, 0.6)), weight, round(weight * rng.uniform(1800, 2400)))
 
-    # 3. ПРОЕКТЫ (С НУМЕРАЦИЕЙ "00-000 Name")
-    projects = [
-        "02-016 Wohnpark Berlin-Mitte", 
-        "05-104 Einkaufszentrum West", 
-        "03-099 Logistikzentrum Nord"
-    ]
-    for proj in projects:
-        try: c.execute("INSERT INTO projects (name) VALUES (?)", (proj,))
-        except: pass
+def entry_rows(rng, worker_ids, scaffolds_by_project, days, per_day, end_date):
+    # Pro Mitarbeiter und Tag per_day Buchungen auf zufällige Gerüste
+    projects = list(scaffolds_by_project)
+    for wid in worker_ids:
+        for d in range(days):
+            work_date = (end_date - timedelta(days=d)).isoformat()
+            for _ in range(per_day):
+                pid = rng.choice(projects)
+                yield (pid, rng.choice(scaffolds_by_project[pid]), wid, work_date,
+                       rng.choice(HOURS), rng.choice(COMMENTS), rng.choice(VERSIONS))
 
-    conn.commit()
+def _batches(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch; batch = []
+    if batch: yield batch
 
-    # 4. ЛЕСА
-    proj_map = {}
-    for proj in projects:
-        c.execute("SELECT id FROM projects WHERE name = ?", (proj,))
-        proj_map[proj] = c.fetchone()[0]
+def seed_data(conn, projects=3, scaffolds=2, workers=4, days=10, per_day=1, seed=42, end_date=None):
+    rng = random.Random(seed)
+    end_date = end_date or date.today()
+    c = conn.cursor()
+
+    # 1. СОТРУДНИКИ / ПРОЕКТЫ
+    w_rows, p_names = worker_rows(workers), project_names(projects)
+    c.executemany("INSERT OR IGNORE INTO workers (name, position) VALUES (?, ?)", w_rows)
+    c.executemany("INSERT OR IGNORE INTO projects (name) VALUES (?)", [(p,) for p in p_names])
+    worker_map = dict(c.execute("SELECT name, id FROM workers"))
+    project_map = dict(c.execute("SELECT name, id FROM projects"))
+    worker_ids = [worker_map[name] for name, _ in w_rows]
+    project_ids = [project_map[name] for name in p_names]
 
-    # Данные привязаны к новым именам проектов
-    scaffolds_data = [
-        # Проект (Новое имя), Номер, Описание, ACC, m3, m2, to, Materialwert
-        ("02-016 Wohnpark Berlin-Mitte", "G-101", "Nordfassade", "ja", 120, 60, 3.5, 7500),
-        ("02-016 Wohnpark Berlin-Mitte", "G-102", "Südfassade", "nein", 250, 120, 6.2, 14000),
-        ("05-104 Einkaufszentrum West", "E-05", "Haupteingang", "ja", 80, 40, 2.1, 4200),
-        ("03-099 Logistikzentrum Nord", "L-50", "Halle Innen", "", 500, 200, 12.5, 28000)
-    ]
+    # 2. ЛЕСА
+    print(f"🪜 Installiere Gerüste ({projects} × {scaffolds})...")
+    c.executemany("""INSERT OR IGNORE INTO scaffolds (project_id, number, description, acc, volume_m3, area_m2, weight_to, material_cost)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", scaffold_rows(rng, project_ids, scaffolds))
+    scaffolds_by_project = {pid: [] for pid in project_ids}
+    for sid, pid in c.execute("SELECT id, project_id FROM scaffolds ORDER BY id"):
+        if pid in scaffolds_by_project: scaffolds_by_project[pid].append(sid)
 
-    print(f"🪜 Installiere Gerüste...")
-    for row in scaffolds_data:
-        p_name, num, desc, acc, vol, area, weight, cost = row
-        if p_name in proj_map:
-            p_id = proj_map[p_name]
-            try:
-                c.execute('''INSERT INTO scaffolds 
-                             (project_id, number, description, acc, volume_m3, area_m2, weight_to, material_cost) 
-                             VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', 
-                          (p_id, num, desc, acc, vol, area, weight, cost))
-            except sqlite3.IntegrityError: pass
+    # 3. ОТЧЕТЫ (ЧАСЫ) direkt in work_entries (die Rollup-Trigger laufen mit)
+    total = workers * days * per_day
+    print(f"📝 Generiere {total} Stunden-Buchungen...")
+    for batch in _batches(entry_rows(rng, worker_ids, scaffolds_by_project, days, per_day, end_date)):
+        c.executemany("""INSERT INTO work_entries (project_id, scaffold_id, worker_id, work_date, hours, comment, version)
+                         VALUES (?, ?, ?, ?, ?, ?, ?)""", batch)
+    return total
 
-    # 5. ОТЧЕТЫ (ЧАСЫ)
-    print("📝 Generiere Stunden-Buchungen...")
-    
-    scaffolds_in_projects = {}
-    for row in scaffolds_data:
-        p_name, s_num = row[0], row[1]
-        if p_name not in scaffolds_in_projects: scaffolds_in_projects[p_name] = []
-        scaffolds_in_projects[p_name].append(s_num)
-    
-    today = date.today()
-    
-    for worker_name, _ in workers:
-        for i in range(5): 
-            delta = random.randint(0, 10)
-            work_date = today - timedelta(days=delta)
-            proj = random.choice(projects) # Выбирает проект из нового списка
-            
-            if proj in scaffolds_in_projects:
-                scaf = random.choice(scaffolds_in_projects[proj])
-                hours = random.choice([2.0, 4.0, 5.5, 8.0])
-                comment = random.choice(["", "Korrektur Statik", "Entwurf", "Detailplanung"])
-                version = random.choice(["v1", "v2", ""])
-                
-                c.execute('''INSERT INTO work_logs 
-                             (user_name, project_name, scaffold_number, work_date, hours, comment, version) 
-                             VALUES (?, ?, ?, ?, ?, ?, ?)''', 
-                          (worker_name, proj, scaf, work_date, hours, comment, version))
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Testdaten erzeugen")
+    parser.add_argument("--db", default=db.DB_FILE, help="Datenbank-Datei")
+    parser.add_argument("--projects", type=int, default=3)
+    parser.add_argument("--scaffolds", type=int, default=2, help="Gerüste pro Projekt")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--days", type=int, default=10)
+    parser.add_argument("--per-day", type=int, default=1, help="Buchungen pro Mitarbeiter und Tag")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="Datenbank vorher leeren")
+    args = parser.parse_args(argv)
 
-    conn.commit()
-    conn.close()
+    print("🌱 Starte Datengenerierung (Mit Projektnummern)...")
+    if args.db != db.DB_FILE: db.use_database(args.db)
+    db.init_db(force_reset=args.reset)
+    with db.get_pool().write() as conn:
+        seed_data(conn, args.projects, args.scaffolds, args.workers, args.days, args.per_day, args.seed)
     print("✅ Fertig! Datenbank ist bereit.")
 
 if __name__ == "__main__":
-    seed_data()
\ No newline at end of file
+    main()
@@ -0,0 +1,196 @@
+import io
+import os
+import json
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+
+import db
+from db import get_pool
+from queries import MASTER_COLUMNS
+
+# --- ANALYSE-SNAPSHOT (Arrow IPC) ---
+# work_logs und scaffolds als spaltenweise Arrow-Dateien neben der DB
+# (<db>.snapshot/). Gelesen wird per memory_map -> keine Kopie, nur die
+# benötigten Spalten werden nach pandas umgewandelt.
+# Aktualisierung:
+# - neue Buchungen (id > last_id) als zusätzliche Teil-Datei (inkrementell)
+# - UPDATE/DELETE/Umbenennungen (change_counters, Migration 7) -> Neuaufbau
+# - ab SNAPSHOT_MAX_PARTS Teil-Dateien -> Neuaufbau (eine Datei)
+SNAPSHOT_MAX_PARTS = 16
+
+WORK_LOGS_SCHEMA = pa.schema([
+    ('id', pa.int64()), ('project_id', pa.int64()), ('scaffold_id', pa.int64()), ('worker_id', pa.int64()),
+    ('user_name', pa.string()), ('project_name', pa.string()), ('scaffold_number', pa.string()),
+    ('work_date', pa.string()), ('hours', pa.float64()), ('comment', pa.string()), ('version', pa.string()),
+])
+SCAFFOLDS_SCHEMA = pa.schema([
+    ('id', pa.int64()), ('project_id', pa.int64()), ('project_name', pa.string()), ('number', pa.string()),
+    ('description', pa.string()), ('volume_m3', pa.float64()), ('area_m2', pa.float64()), ('weight_to', pa.float64()),
+    ('material_cost', pa.float64()), ('acc', pa.string()),
+])
+WORK_LOGS_SQL = """
+    SELECT e.id, e.project_id, e.scaffold_id, e.worker_id, k.name, p.name, s.number, e.work_date, e.hours, e.comment, e.version
+    FROM work_entries e
+    JOIN workers k ON k.id = e.worker_id
+    JOIN projects p ON p.id = e.project_id
+    JOIN scaffolds s ON s.id = e.scaffold_id
+    WHERE e.id > ? ORDER BY e.id"""
+SCAFFOLDS_SQL = """
+    SELECT s.id, s.project_id, p.name, s.number, s.description, s.volume_m3, s.area_m2, s.weight_to, s.material_cost, s.acc
+    FROM scaffolds s JOIN projects p ON p.id = s.project_id"""
+
+_lock = threading.Lock()
+
+def snapshot_dir():
+    return db.DB_FILE + ".snapshot"
+
+def _read_meta(path):
+    try:
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f: return json.load(f)
+    except (OSError, ValueError): return None
+
+def _write_atomic(path, write):
+    tmp = path + ".tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+def _to_table(rows, schema):
+    columns = list(zip(*rows)) if rows else [[] for _ in schema]
+    return pa.table([pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema)
+
+def _write_ipc(path, table):
+    def write(tmp):
+        with pa.OSFile(tmp, 'wb') as sink, ipc.new_file(sink, table.schema) as writer: writer.write_table(table)
+    _write_atomic(path, write)
+
+def _counters(conn):
+    return dict(conn.execute("SELECT name, value FROM change_counters"))
+
+def refresh_snapshot(force=False):
+    # Liefert die Metadaten inkl. 'mode': unchanged | incremental | rebuild
+    with _lock:
+        path = snapshot_dir()
+        os.makedirs(path, exist_ok=True)
+        meta = _read_meta(path)
+        with get_pool().read() as conn:
+            # Eine Lese-Transaktion -> Zähler, max(id) und Daten aus demselben Stand
+            conn.execute("BEGIN")
+            try:
+                counters = _counters(conn)
+                max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM work_entries").fetchone()[0]
+                rebuild = (force or meta is None or meta.get('db_file') != os.path.abspath(db.DB_FILE)
+                           or any(meta['counters'].get(k) != counters.get(k) for k in ('epoch', 'work_logs'))
+                           or max_id < meta['last_id'] or len(meta['parts']) >= SNAPSHOT_MAX_PARTS)
+                scaffolds_changed = rebuild or meta['counters'].get('scaffolds') != counters.get('scaffolds')
+
+                if rebuild:
+                    old_parts = meta['parts'] if meta else []
+                    meta = {'db_file': os.path.abspath(db.DB_FILE), 'last_id': 0, 'parts': [], 'rows': 0, 'seq': (meta or {}).get('seq', 0)}
+                else:
+                    old_parts = []
+                new_rows = 0
+                if rebuild or max_id > meta['last_id']:
+                    table = _to_table(conn.execute(WORK_LOGS_SQL, (meta['last_id'],)).fetchall(), WORK_LOGS_SCHEMA)
+                    if table.num_rows or not meta['parts']:
+                        meta['seq'] += 1
+                        part = f"work_logs-{meta['seq']:06d}.arrow"
+                        _write_ipc(os.path.join(path, part), table)
+                        meta['parts'].append(part)
+                        new_rows = table.num_rows
+                        meta['rows'] += new_rows
+                    meta['last_id'] = max_id
+                if scaffolds_changed:
+                    _write_ipc(os.path.join(path, "scaffolds.arrow"), _to_table(conn.execute(SCAFFOLDS_SQL).fetchall(), SCAFFOLDS_SCHEMA))
+            finally:
+                conn.execute("COMMIT")
+
+        mode = 'rebuild' if rebuild else ('incremental' if new_rows or scaffolds_changed else 'unchanged')
+        meta['counters'] = counters
+        if mode != 'unchanged':
+            _write_atomic(os.path.join(path, "meta.json"), lambda tmp: open(tmp, "w", encoding="utf-8").write(json.dumps(meta)))
+            for part in old_parts:
+                try: os.remove(os.path.join(path, part))
+                except OSError: pass
+        return dict(meta, mode=mode, new_rows=new_rows)
+
+# --- LESEN (memory-mapped, spaltenweise) ---
+def _read_ipc(path, columns=None):
+    table = ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    return table.select(columns) if columns else table
+
+def load_work_logs(columns=None):
+    path = snapshot_dir()
+    meta = _read_meta(path)
+    if meta is None: meta = refresh_snapshot()
+    try: tables = [_read_ipc(os.path.join(path, part), columns) for part in meta['parts']]
+    except FileNotFoundError:
+        # Teil-Dateien inzwischen von einem Neuaufbau (andere Sitzung) gelöscht -> neue Metadaten, einmal wiederholen
+        meta = _read_meta(path) or refresh_snapshot()
+        tables = [_read_ipc(os.path.join(path, part), columns) for part in meta['parts']]
+    return pa.concat_tables(tables) if tables else _to_table([], WORK_LOGS_SCHEMA).select(columns or WORK_LOGS_SCHEMA.names)
+
+def load_scaffolds(columns=None):
+    path = snapshot_dir()
+    if _read_meta(path) is None: refresh_snapshot()
+    return _read_ipc(os.path.join(path, "scaffolds.arrow"), columns)
+
+def _is_in(table, column, values):
+    return table.filter(pc.is_in(table[column], value_set=pa.array(list(values), type=pa.string())))
+
+# Gleiche Ergebnisse wie queries.load_master / load_project_* (SQL), aber aus dem Snapshot
+def load_master_snapshot(projects=(), workers=(), scaffolds=()):
+    scaf = load_scaffolds()
+    if projects: scaf = _is_in(scaf, 'project_name', projects)
+    if scaffolds: scaf = _is_in(scaf, 'number', scaffolds)
+    work = load_work_logs(['scaffold_id', 'user_name', 'hours'])
+    if workers: work = _is_in(work, 'user_name', workers)
+    work = work.filter(pc.is_in(work['scaffold_id'], value_set=scaf['id'].combine_chunks()))
+
+    # Stufe 1: Stunden je Gerüst und Planer, Stufe 2: je Gerüst (Planer sortiert, wie group_concat)
+    per_worker = work.group_by(['scaffold_id', 'user_name']).aggregate([('hours', 'sum')]).to_pandas()
+    per_worker = per_worker.sort_values(['scaffold_id', 'user_name'])
+    per_scaffold = per_worker.groupby('scaffold_id').agg(Planer=('user_name', ', '.join), Planungsstunden=('hours_sum', 'sum'))
+
+    df = scaf.to_pandas().set_index('id')
+    df = df.join(per_scaffold, how='inner' if workers else 'left')
+    vol, area, weight, cost = (df[c].fillna(0.0) for c in ('volume_m3', 'area_m2', 'weight_to', 'material_cost'))
+    out = pd.DataFrame({
+        'Projekt': df['project_name'], 'Gerüstnummer': df['number'],
+        'm3': vol, 'm2': area, 'to': weight, 'Materialwert': cost,
+        'Eur/to': (cost / weight).where(weight > 0, 0.0),
+        'Euro/m3': (cost / vol).where(vol > 0, 0.0),
+        'kg/m3': (weight * 1000 / vol).where(vol > 0, 0.0),
+        'Planer': df['Planer'].fillna(''), 'ACC': df['acc'].fillna(''), 'Beschreibung': df['description'].fillna(''),
+        'Planungsstunden': df['Planungsstunden'].fillna(0.0),
+    })
+    return db.compact_frame(out.sort_values(['Projekt', 'Gerüstnummer'], kind='stable').reset_index(drop=True)[MASTER_COLUMNS])
+
+def load_project_totals_snapshot(project_name):
+    scaf = _is_in(load_scaffolds(['project_name', 'volume_m3', 'material_cost']), 'project_name', [project_name])
+    work = _is_in(load_work_logs(['project_name', 'hours']), 'project_name', [project_name])
+    return pd.DataFrame({'volume_m3': [pc.sum(scaf['volume_m3']).as_py() or 0.0],
+                         'material_cost': [pc.sum(scaf['material_cost']).as_py() or 0.0],
+                         'hours': [pc.sum(work['hours']).as_py() or 0.0]})
+
+def _project_hours_by(project_name, column, name):
+    work = _is_in(load_work_logs(['project_name', column, 'hours']), 'project_name', [project_name])
+    df = work.group_by(column).aggregate([('hours', 'sum')]).to_pandas()
+    # Nur NULL-Stunden -> Summe NULL; die Rollups (SQL) zählen NULL als 0
+    df['hours_sum'] = df['hours_sum'].fillna(0.0)
+    return df.rename(columns={column: name, 'hours_sum': 'hours'}).sort_values(name).reset_index(drop=True)[[name, 'hours']]
+
+def load_project_worker_hours_snapshot(project_name):
+    return _project_hours_by(project_name, 'user_name', 'user_name')
+
+def load_project_scaffold_hours_snapshot(project_name):
+    return _project_hours_by(project_name, 'scaffold_number', 'scaffold_number')
+
+# --- PARQUET-EXPORT ---
+def to_parquet(df):
+    output = io.BytesIO()
+    df.to_parquet(output, index=False, engine='pyarrow')
+    return output.getvalue()
@@ -0,0 +1,93 @@
+from datetime import timedelta
+
+import pandas as pd
+
+from db import get_data, run_write
+
+# --- WOCHENRASTER ---
+# Gerüste × Wochentage eines Mitarbeiters in einem Projekt. Eine Zelle = Summe der
+# Stunden des Tages auf dem Gerüst. Gespeichert werden nur geänderte Zellen, alle in
+# einer Schreib-Transaktion (executemany):
+# - leere Zelle -> Wert: INSERT
+# - Zelle mit genau einer Buchung: UPDATE der Stunden bzw. DELETE bei 0/leer
+# - Zellen mit mehreren Buchungen (z.B. verschiedene Anmerkungen) sind gesperrt,
+#   die bleiben in der Einzelbuchung bzw. der Stundenübersicht änderbar
+WEEKDAYS = ["Mo", "Di", "Mi", "Do", "Fr", "Sa", "So"]
+MAX_HOURS_PER_DAY = 24.0
+
+CELLS_SQL = """
+    SELECT e.scaffold_id, e.work_date, SUM(e.hours) AS hours, COUNT(*) AS entries, MIN(e.id) AS entry_id
+    FROM work_entries e JOIN workers k ON k.id = e.worker_id
+    WHERE k.name = ? AND e.project_id = ? AND e.work_date BETWEEN ? AND ?
+    GROUP BY e.scaffold_id, e.work_date"""
+
+def week_start(d):
+    return d - timedelta(days=d.weekday())
+
+def week_days(start):
+    return {f"{WEEKDAYS[i]} {start + timedelta(days=i):%d.%m.}": (start + timedelta(days=i)).isoformat() for i in range(7)}
+
+def _week_params(worker_name, project_id, start):
+    return (worker_name, int(project_id), start.isoformat(), (start + timedelta(days=6)).isoformat())
+
+def _cell_map(rows):
+    return {(int(sid), day): (float(hours or 0.0), int(entries), int(entry_id)) for sid, day, hours, entries, entry_id in rows}
+
+def load_week(worker_name, project_id, start):
+    # -> (Raster mit Index scaffold_id, {(scaffold_id, Datum): (Stunden, Anzahl, erste ID)})
+    days = week_days(start)
+    scaffolds = get_data("SELECT id, number, description FROM scaffolds WHERE project_id = ? ORDER BY number", (int(project_id),))
+    cells = _cell_map(get_data(CELLS_SQL, _week_params(worker_name, project_id, start)).itertuples(index=False, name=None))
+
+    grid = pd.DataFrame(index=pd.Index(scaffolds['id'].astype(int), name='scaffold_id'))
+    grid['Gerüst'] = (scaffolds['number'] + scaffolds['description'].fillna('').map(lambda d: f" ({d})" if d else "")).values
+    for label, day in days.items():
+        grid[label] = [cells[(sid, day)][0] if (sid, day) in cells else None for sid in grid.index]
+    grid[list(days)] = grid[list(days)].astype(float)
+    return grid, cells
+
+def changed_cells(before, after, start):
+    # Nur Zellen, deren Wert sich geändert hat -> [(scaffold_id, Datum, alt, neu)]
+    days = week_days(start)
+    old = before[list(days)].fillna(0.0).rename(columns=days)
+    new = after[list(days)].fillna(0.0).rename(columns=days)
+    diff = (new - old).abs() > 1e-9
+    changes = diff.stack()
+    changes = changes[changes]
+    return [(int(sid), day, float(old.at[sid, day]), float(new.at[sid, day])) for sid, day in changes.index]
+
+def validate_week(after, changes, cells, start):
+    errors = []
+    days = week_days(start)
+    values = after[list(days)].fillna(0.0)
+    if (values < 0).any().any(): errors.append("Negative Stunden sind nicht erlaubt.")
+    for label, total in values.sum().items():
+        if total > MAX_HOURS_PER_DAY: errors.append(f"{label}: {total:g} h an einem Tag (max. {MAX_HOURS_PER_DAY:g} h).")
+    numbers = after['Gerüst'].to_dict()
+    for sid, day, _, _ in changes:
+        if cells.get((sid, day), (0, 0, 0))[1] > 1:
+            errors.append(f"{numbers[sid]}, {day}: mehrere Buchungen – bitte in der Einzelbuchung korrigieren.")
+    return errors
+
+def save_week(worker_name, project_id, start, changes, comment="", version=""):
+    # Eine Transaktion; Konflikt (Zelle inzwischen von anderer Seite geändert) -> ValueError, nichts geschrieben
+    project_id = int(project_id)
+    def mutation(conn):
+        inserts, updates, deletes = [], [], []
+        worker = conn.execute("SELECT id FROM workers WHERE name = ?", (worker_name,)).fetchone()
+        if worker is None: raise ValueError(f"Mitarbeiter '{worker_name}' nicht gefunden")
+        worker_id = worker[0]
+        current = _cell_map(conn.execute(CELLS_SQL, _week_params(worker_name, project_id, start)))
+        for sid, day, old, new in changes:
+            hours, entries, entry_id = current.get((sid, day), (0.0, 0, None))
+            if abs(hours - old) > 1e-9: raise ValueError(f"Buchung am {day} wurde zwischenzeitlich geändert – bitte neu laden.")
+            if entries > 1: raise ValueError(f"Mehrere Buchungen am {day} – bitte in der Einzelbuchung korrigieren.")
+            if not entries: inserts.append((project_id, sid, worker_id, day, new, comment, version))
+            elif new > 0: updates.append((new, entry_id))
+            else: deletes.append((entry_id,))
+        conn.executemany("""INSERT INTO work_entries (project_id, scaffold_id, worker_id, work_date, hours, comment, version)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)""", inserts)
+        conn.executemany("UPDATE work_entries SET hours = ? WHERE id = ?", updates)
+        conn.executemany("DELETE FROM work_entries WHERE id = ?", deletes)
+        return {'inserted': len(inserts), 'updated': len(updates), 'deleted': len(deletes)}
+    return run_write(mutation)